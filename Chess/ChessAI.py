@@ -1,37 +1,49 @@
 import random
+import time
 
-pieceScores = {"K": 0, "Q": 9, "R": 5, "B": 3.01, "N":3, "p" : 1}
-CHECKMATE = 1000
+from Chess import ChessBook, ChessTablebase
+from Chess.ChessEngine import GameState, NULL_MOVE, STATUS_ONGOING, STATUS_CHECKMATE, STATUS_STALEMATE
+from Chess.ChessTranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from Chess.ChessEvaluation import pieceValues
+
+#all scores are integer centipawns
+CHECKMATE = 10000
 STALEMATE = 0
+REPETITION_PENALTY = 50
+CAPTURE_BONUS = 2 #for the side that captured on the last move
 DEPTH = 3
-
-pawnScores =[
-[0,  0,  0,  0,  0,  0,  0,  0],
-[50, 50, 50, 50, 50, 50, 50, 50],
-[10, 10, 20, 30, 30, 20, 10, 10],
-[ 5,  5, 10, 25, 25, 10,  5,  5],
- [0,  0,  0, 20, 20,  0,  0,  0],
- [5, -5,-10,  0,  0,-10, -5,  5],
- [5, 10, 10,-20,-20, 10, 10,  5],
- [0,  0,  0,  0,  0,  0,  0,  0]
-]
-
-kingScores=[
-[-30,-40,-40,-50,-50,-40,-40,-30],
-[-30,-40,-40,-50,-50,-40,-40,-30],
-[-30,-40,-40,-50,-50,-40,-40,-30],
-[-30,-40,-40,-50,-50,-40,-40,-30],
-[-20,-30,-30,-40,-40,-30,-30,-20],
-[-10,-20,-20,-20,-20,-20,-20,-10],
-[20, 20,  0,  0,  0,  0, 20, 20],
-[20, 40, 10,  0,  0, 10, 30, 20]
-]
-
-piecePositionScores = {
-    'p': pawnScores,
-    'K' : kingScores
-                        }
-
+MAX_DEPTH = 32 #deepest iteration ever searched, and the one tried when searching on a time or node budget
+TT_SIZE_MB = 16 #memory budget of the transposition table
+USE_BOOK = True #play from the opening book (ChessBook.DEFAULT_BOOK_PATH) while the position is in it
+TABLEBASE_WIN = CHECKMATE - 1000 #score of a tablebase win, less the plies to mate, below the mates the search finds
+#a mate scores CHECKMATE when the search finds it, TABLEBASE_WIN from the tablebases, less the plies from the root to it
+MAX_MATE_PLIES = 500
+MATE_BOUND = TABLEBASE_WIN - MAX_MATE_PLIES #scores beyond this are mates
+
+#move ordering scores, every band sits above the next one
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000 #plus most valuable victim, least valuable attacker
+KILLER_SCORES = (90000, 80000)
+HISTORY_LIMIT = 50000 #quiet move history stays below the killers
+mvvLvaValues = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 10}
+
+#quiescence search
+DELTA_MARGIN = 200 #two pawns, a capture that can't lift the score to alpha even with this much extra is skipped
+seeValues = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 100}
+
+#null move pruning and late move reductions
+REDUCTION_MIN_DEPTH = 3 #neither is tried closer to the leaves than this
+NULL_MOVE_REDUCTION = 2 #the null move is searched this many plies shallower, on top of the ply it takes
+LMR_FULL_DEPTH_MOVES = 3 #moves searched at full depth before the reductions start
+LMR_LATE_MOVES = 8 #moves from here on are reduced by two plies instead of one
+
+#aspiration windows: half widths of the root window around the previous iteration's score, the side that fails
+#moves out to the next width, and past the last one to the full window
+ASPIRATION_WINDOWS = (50, 200, 800)
+ASPIRATION_MIN_DEPTH = 3 #the scores of the first iterations swing too much to aim a window with
+
+#kept for the whole game so each search can reuse the work of the earlier ones
+transpositionTable = TranspositionTable(TT_SIZE_MB)
 
 '''
 Picks and returns a random move
@@ -80,148 +92,768 @@ def findBestMaterialMove(gs, validMoves): #greedy
 
 
 
-'''Helper method to make first recursive call'''
-def findBestMove(gs, validMoves):
-    global nextMove, counter
-    counter = 0
-    nextMove = None
-    random.shuffle(validMoves)
-    #findMoveMinMax(gs, validMoves,  DEPTH, not gs.whiteToMove)
-    #findNegaMaxMove(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1 )
-    findNegaMaxAlphaBetaMove(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    if nextMove is None:
-        print("WARNING: AI couldn't find move, using fallback")
-        nextMove = validMoves[0]
-    print(counter)
+'''
+Helper method to make first recursive call
+Thin wrapper over a Searcher shared by the whole game, so its transposition table carries over between moves.
+A book move, picked by its weight, is played without searching; the book is where the AI's variety comes from.
+'''
+def findBestMove(gs, validMoves, timeLimit=None, nodeLimit=None, depth=None):
+    if USE_BOOK:
+        bookMove = ChessBook.findBookMove(gs, validMoves)
+        if bookMove is not None:
+            return bookMove
+    return defaultSearcher.findBestMove(gs, validMoves, timeLimit, nodeLimit, depth)
 
-    return nextMove
 
-def findMoveMinMax(gs, validMoves, depth, whiteToMove):
-    global nextMove
-    if depth == 0:
-        return scoreMaterial(gs.board)
+'''
+What one search did, filled in by the Searcher as it goes (searcher.stats).
+Node counts, cutoffs, depth and score are always there. TT probes and hits and the time split between move generation,
+evaluation and ordering are only measured when the Searcher is created with profile=True, since timing every call
+slows the search down.
+'''
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.qNodes = 0 #of those, quiescence nodes
+        self.seconds = 0.0
+        self.depth = 0 #deepest completed iteration
+        self.score = None #centipawns from the side to move's point of view
+        self.bestMove = None
+        self.iterationNodes = [] #nodes searched by each completed iteration
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.ttCutoffs = 0 #nodes settled by a transposition table entry without being searched
+        self.tablebaseHits = 0 #nodes scored from the endgame tablebases
+        self.nullMoveCutoffs = 0 #nodes cut off by passing the move
+        self.reductions = 0 #moves searched shallower by late move reductions
+        self.researches = 0 #zero window or reduced searches that had to be repeated
+        self.aspirationSearches = 0 #iterations started with an aspiration window
+        self.aspirationFailLows = 0 #root searches repeated because the score fell below the window
+        self.aspirationFailHighs = 0 #and above it
+        self.profiled = False
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.moveGenTime = 0.0
+        self.evalTime = 0.0
+        self.orderTime = 0.0
+
+    def nodesPerSecond(self):
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def ttHitRate(self):
+        return self.ttHits / self.ttProbes if self.ttProbes else 0.0
+
+    #root re-searches per iteration started with an aspiration window
+    def aspirationResearchRate(self):
+        return (self.aspirationFailLows + self.aspirationFailHighs) / self.aspirationSearches \
+            if self.aspirationSearches else 0.0
+
+    #how many times more nodes the last iteration took than the one before it
+    def effectiveBranchingFactor(self):
+        if len(self.iterationNodes) < 2 or self.iterationNodes[-2] == 0:
+            return 0.0
+        return self.iterationNodes[-1] / self.iterationNodes[-2]
+
+    #the UCI info line for the search so far, a mate score goes out as moves to mate (negative when getting mated)
+    def uciInfo(self):
+        plies = matePlies(self.score) if self.score is not None else None
+        if plies is None:
+            score = "cp %d" % (self.score or 0)
+        else:
+            score = "mate %d" % ((plies + 1) // 2 if self.score > 0 else -((plies + 1) // 2))
+        info = "info depth %d score %s nodes %d nps %d time %d" % (self.depth, score, self.nodes, self.nodesPerSecond(),
+                                                                    self.seconds * 1000)
+        if self.bestMove is not None:
+            info += " pv " + self.bestMove.getChessNotation() + ("q" if self.bestMove.isPawnPromotion else "")
+        return info
+
+    def __str__(self):
+        text = ("depth %d score %s move %s nodes %d (%d quiescence) %.2fs %d nps ebf %.2f cutoffs %d first move %.0f%% "
+                "tt cutoffs %d tablebase hits %d null move cutoffs %d reductions %d re-searches %d "
+                "aspiration fail low %d high %d in %d iterations (%.2f re-searches each)" %
+                (self.depth, self.score, self.bestMove, self.nodes, self.qNodes, self.seconds, self.nodesPerSecond(),
+                 self.effectiveBranchingFactor(), self.cutoffs, 100 * self.firstMoveCutoffRate(), self.ttCutoffs,
+                 self.tablebaseHits, self.nullMoveCutoffs, self.reductions, self.researches, self.aspirationFailLows,
+                 self.aspirationFailHighs, self.aspirationSearches, self.aspirationResearchRate()))
+        if self.profiled:
+            text += (" tt hits %d/%d (%.0f%%) time in move generation %.2fs evaluation %.2fs ordering %.2fs" %
+                     (self.ttHits, self.ttProbes, 100 * self.ttHitRate(), self.moveGenTime, self.evalTime,
+                      self.orderTime))
+        return text
 
-    random.shuffle(validMoves)
-    if whiteToMove:
-        maxScore = -CHECKMATE
 
+'''
+One search and everything it needs: options, the transposition table, node counter and the move found at the root.
+Nothing is shared between Searchers unless they are handed the same transposition table, so several can run
+in one process, e.g. one per game or one per thread.
+'''
+class Searcher:
+    def __init__(self, transpositionTable=None, depth=DEPTH, ttSizeMB=TT_SIZE_MB, quiescence=True, deltaPruning=True,
+                 useSEE=True, verbose=True, profile=False, tablebases=True, stagedGeneration=True, pvs=True,
+                 nullMovePruning=True, lateMoveReductions=True, aspirationWindows=ASPIRATION_WINDOWS):
+        self.transpositionTable = transpositionTable if transpositionTable is not None else TranspositionTable(ttSizeMB)
+        self.depth = depth #default depth when no time or node budget is given
+        self.quiescence = quiescence #resolve captures at the leaves instead of scoring the board mid exchange
+        self.deltaPruning = deltaPruning
+        self.useSEE = useSEE #skip captures that lose material according to the static exchange evaluation
+        #below the root, generate the moves of a node a stage at a time (see stagedMoves) instead of all up front
+        self.stagedGeneration = stagedGeneration
+        #search every move after the first with a zero window, only proving it's no better, and re-search the ones that are
+        self.pvs = pvs
+        #let the side to move pass, if its opponent still can't get below beta with a shallower search the node is cut off
+        self.nullMovePruning = nullMovePruning
+        #search quiet moves late in the ordering shallower, and again at full depth if they turn out better than alpha
+        self.lateMoveReductions = lateMoveReductions
+        #root window half widths tried in turn around the previous iteration's score, empty for a full window search
+        self.aspirationWindows = tuple(aspirationWindows or ())
+        self.verbose = verbose #print the stats of each search, off when stdout belongs to a protocol like UCI
+        self.profile = profile #count TT hits and time move generation, evaluation and ordering in the stats
+        #positions with at most this many pieces are looked up in the endgame tablebases, 0 when there are none
+        self.tablebasePieces = ChessTablebase.maxPieces() if tablebases else 0
+        self.onIteration = None #optional function called with the stats after every completed iteration
+        self.searchDepth = 0 #depth of the current iteration
+        self.rootPly = 0 #moves in the game state's log at the root, a node's ply is its log length less this
+        self.startDepth = 1 #first iteration of the current search
+        self.stopCheck = None #optional function polled with the budget, returning True stops the search (e.g. a shared flag)
+        self.newSearch()
+
+    #ask a running search to return as soon as possible, safe to call from another thread
+    #like a spent budget it doesn't cut the first iteration short, so the move returned has always been searched
+    def stop(self):
+        self.stopRequested = True
+        if self.completedDepth > 0:
+            self.searchStopped = True
+
+    '''
+    Searches one ply deeper at a time, each iteration starting from the best move of the previous one.
+    timeLimit (seconds) and nodeLimit bound the search, when one runs out the best move of the deepest
+    fully searched iteration is returned. Without a budget the search stops after depth (default self.depth) plies.
+    startDepth skips the shallow iterations, helper searches in a parallel search start deeper than the main one.
+    '''
+    def findBestMove(self, gs, validMoves, timeLimit=None, nodeLimit=None, depth=None, startDepth=1):
+        startTime = time.time()
+        self.newSearch(timeLimit, nodeLimit)
+        if depth is None:
+            depth = self.depth if timeLimit is None and nodeLimit is None else MAX_DEPTH
+        depth = min(depth, MAX_DEPTH) #the per ply tables (killer moves) only go this deep
+        #self.findMoveMinMax(gs, validMoves,  DEPTH, not gs.whiteToMove)
+        #self.findNegaMaxMove(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1 )
+        bestMove = None
+        self.startDepth = startDepth
+        self.rootPly = len(gs.moveLog)
+        #with few enough pieces left the tablebases know the best move, no search needed
+        if self.inTablebases(gs):
+            tablebaseMove = ChessTablebase.bestMove(gs, validMoves)
+            if tablebaseMove is not None:
+                self.stats.tablebaseHits += 1
+                self.nextMove = bestMove = tablebaseMove[0]
+                self.bestScore = self.tablebaseScore(tablebaseMove[1], 0)
+                self.updateStats(startTime)
+                if self.onIteration is not None:
+                    self.onIteration(self.stats)
+                depth = startDepth - 1 #skip the search
+        for self.searchDepth in range(startDepth, depth + 1):
+            self.searchRoot(gs, validMoves)
+            if self.searchStopped:
+                break #the unfinished iteration can't be trusted, keep the previous one
+            bestMove = self.nextMove
+            self.bestScore = self.nextScore
+            self.completedDepth = self.searchDepth
+            self.updateStats(startTime)
+            self.stats.iterationNodes.append(self.counter - sum(self.stats.iterationNodes))
+            if self.onIteration is not None:
+                self.onIteration(self.stats)
+            #the best move of this iteration is searched first in the next one
+            if bestMove is not None:
+                validMoves.remove(bestMove)
+                validMoves.insert(0, bestMove)
+            if self.stopRequested:
+                break #asked to stop while the first iteration ran
+            #an iteration takes longer than everything before it, so don't start one that can't finish
+            if self.stopTime is not None and time.time() - startTime > (self.stopTime - startTime) / 2:
+                break
+        self.nextMove = bestMove
+        if self.nextMove is None:
+            if self.verbose:
+                print("WARNING: AI couldn't find move, using fallback")
+            self.nextMove = validMoves[0]
+        self.updateStats(startTime)
+        if self.verbose:
+            print(self.stats)
+
+        return self.nextMove
+
+    '''
+    One iteration at the root, setting nextMove and nextScore.
+    Once the scores have settled the search starts with a narrow window around the previous iteration's score, which
+    prunes more than the full window. A score outside the window is only a bound, so the root is searched again with
+    the failing side widened to the next of the aspirationWindows, and in the end to the full window.
+    '''
+    def searchRoot(self, gs, validMoves):
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        previousScore = self.bestScore
+        widths = self.aspirationWindows
+        if not widths or previousScore is None or self.searchDepth < ASPIRATION_MIN_DEPTH or \
+                abs(previousScore) >= MATE_BOUND: #no window around a mate score, it can only move by plies
+            self.nextMove = None
+            return self.findNegaMaxAlphaBetaMove(gs, validMoves, self.searchDepth, -CHECKMATE, CHECKMATE, turnMultiplier)
+        self.stats.aspirationSearches += 1
+        lower = upper = 0 #index of the width used below and above the previous score
+        while True:
+            alpha = previousScore - widths[lower] if lower < len(widths) else -CHECKMATE
+            beta = previousScore + widths[upper] if upper < len(widths) else CHECKMATE
+            self.nextMove = None
+            score = self.findNegaMaxAlphaBetaMove(gs, validMoves, self.searchDepth, alpha, beta, turnMultiplier)
+            if self.searchStopped:
+                return score
+            if score <= alpha and alpha > -CHECKMATE:
+                self.stats.aspirationFailLows += 1
+                lower += 1
+            elif score >= beta and beta < CHECKMATE:
+                self.stats.aspirationFailHighs += 1
+                upper += 1
+            else:
+                return score
+
+    #reset the counters, budget and move ordering state for a new search
+    def newSearch(self, timeLimit=None, nodeLimit=None):
+        self.stats = SearchStats() #of the last or current search, the search counts its cutoffs etc. straight into it
+        self.nextMove = None #best move found at the root of the current iteration
+        self.nextScore = None #and its score, from the side to move's point of view
+        self.bestScore = None #score of the move returned by the last search
+        self.completedDepth = 0 #deepest iteration the last search finished
+        #kept on the searcher rather than in the stats since the budget check reads it at every node
+        self.counter = 0 #nodes searched
+        self.qCounter = 0 #of those, quiescence nodes
+        self.searchStopped = False
+        self.stopRequested = False #stop was called, the search ends as soon as it has a searched move to return
+        self.stopTime = time.time() + timeLimit if timeLimit is not None else None
+        self.maxNodes = nodeLimit
+        self.transpositionTable.newSearch()
+        #move ordering state: two quiet moves per ply that caused a cutoff, and a score per from/to square pair
+        #for quiet moves that caused cutoffs anywhere in the tree
+        self.killerMoves = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history = [0] * (64 * 64)
+        #the search calls these through the searcher so profiling can swap in timed versions, at no cost when it's off
+        if self.profile:
+            self.startProfiling()
+        else:
+            self.generateMoves = GameState.getValidMoves
+            self.generateCaptures = capturesAndLegality
+            self.evaluate = scoreBoard
+            self.probe = self.transpositionTable.probe
+            #back to the plain methods if profiling was on before
+            for name in ("orderMoves", "stagedMoves", "sortStage"):
+                self.__dict__.pop(name, None)
+
+    #copy the node counts and the result so far into the stats
+    def updateStats(self, startTime):
+        stats = self.stats
+        stats.nodes = self.counter
+        stats.qNodes = self.qCounter
+        stats.seconds = time.time() - startTime
+        stats.depth = self.completedDepth
+        stats.score = self.bestScore
+        stats.bestMove = self.nextMove if self.nextMove is not None else stats.bestMove
+
+    #replace the move generation, evaluation, ordering and probe hooks with versions that count and time themselves
+    def startProfiling(self):
+        stats = self.stats
+        stats.profiled = True
+        getValidMoves = GameState.getValidMoves
+        orderMoves = Searcher.orderMoves.__get__(self)
+        stagedMoves = Searcher.stagedMoves.__get__(self)
+        sortStage = Searcher.sortStage.__get__(self)
+        probe = self.transpositionTable.probe
+        perfCounter = time.perf_counter
+
+        def generateMoves(gs):
+            startTime = perfCounter()
+            moves = getValidMoves(gs)
+            stats.moveGenTime += perfCounter() - startTime
+            return moves
+
+        def generateCaptures(gs):
+            startTime = perfCounter()
+            captures = capturesAndLegality(gs)
+            stats.moveGenTime += perfCounter() - startTime
+            return captures
+
+        #the staged generator's own time between moves is generation and legality checking, less the sorting in it
+        def timedStagedMoves(gs, hashMoveID, ply):
+            moves = stagedMoves(gs, hashMoveID, ply)
+            while True:
+                startTime = perfCounter()
+                orderTime = stats.orderTime
+                move = next(moves, None)
+                stats.moveGenTime += perfCounter() - startTime - (stats.orderTime - orderTime)
+                if move is None:
+                    return
+                yield move
+
+        def timedSortStage(moves, key):
+            startTime = perfCounter()
+            sortStage(moves, key)
+            stats.orderTime += perfCounter() - startTime
+
+        def evaluate(gs):
+            startTime = perfCounter()
+            score = scoreBoard(gs)
+            stats.evalTime += perfCounter() - startTime
+            return score
+
+        def timedOrderMoves(moves, hashMoveID, ply):
+            startTime = perfCounter()
+            orderedMoves = orderMoves(moves, hashMoveID, ply)
+            stats.orderTime += perfCounter() - startTime
+            return orderedMoves
+
+        def countedProbe(key):
+            entry = probe(key)
+            stats.ttProbes += 1
+            if entry is not None:
+                stats.ttHits += 1
+            return entry
+
+        self.generateMoves = generateMoves
+        self.generateCaptures = generateCaptures
+        self.evaluate = evaluate
+        self.orderMoves = timedOrderMoves
+        self.stagedMoves = timedStagedMoves
+        self.sortStage = timedSortStage
+        self.probe = countedProbe
+
+    def inTablebases(self, gs):
+        return self.tablebasePieces and gs.pieceCount() <= self.tablebasePieces
+
+    #score of a tablebase result (WIN, DRAW or LOSS for the side to move, plies to mate) at ply, quicker mates score higher
+    def tablebaseScore(self, result, ply):
+        outcome, plies = result
+        if outcome == ChessTablebase.DRAW:
+            return STALEMATE
+        return outcome * (TABLEBASE_WIN - ply - plies)
+
+    '''
+    Checked every few thousand nodes (and when the node budget is reached), stops the search once the time or node budget is spent
+    The first iteration always runs to the end so there is a move to play
+    '''
+    def checkBudget(self):
+        if self.searchDepth > self.startDepth and ((self.stopTime is not None and time.time() >= self.stopTime) or
+                                                   (self.maxNodes is not None and self.counter >= self.maxNodes)):
+            self.searchStopped = True
+        if self.stopCheck is not None and self.stopCheck():
+            self.searchStopped = True
+
+    def findMoveMinMax(self, gs, validMoves, depth, whiteToMove):
+        if depth == 0:
+            return scoreMaterial(gs.board)
+
+        random.shuffle(validMoves)
+        if whiteToMove:
+            maxScore = -CHECKMATE
+
+            for move in validMoves:
+                gs.makeMove(move)
+                nextMoves = gs.getValidMoves()
+                score = self.findMoveMinMax(gs, nextMoves, depth - 1, not whiteToMove)
+                if score > maxScore:
+                    maxScore = score
+                    if depth == self.searchDepth:
+                        self.nextMove = move
+                gs.undoMove()
+            return maxScore
+
+        else:
+            minScore = CHECKMATE
+            for move in validMoves:
+                gs.makeMove(move)
+                nextMoves = gs.getValidMoves()
+                score = self.findMoveMinMax(gs, nextMoves, depth - 1, not whiteToMove)
+                if score < minScore:
+                    minScore = score
+                    if depth == self.searchDepth:
+                        self.nextMove = move
+                gs.undoMove()
+            return minScore
+
+    def findNegaMaxMove(self, gs, validMoves, depth, turnMultiplier):
+        self.counter += 1
+        #always looking for maximum, negating it gives us black's best move, i.e. the minimum
+        if depth == 0: #base case
+            return turnMultiplier * scoreBoard(gs)
+
+        maxScore = -CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
             nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, not whiteToMove)
+            score = -self.findNegaMaxMove(gs, nextMoves, depth - 1, -turnMultiplier)     #recursive call
+
             if score > maxScore:
                 maxScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                if depth == self.searchDepth:
+                    self.nextMove = move
+
             gs.undoMove()
         return maxScore
 
-    else:
-        minScore = CHECKMATE
-        for move in validMoves:
+    def findNegaMaxAlphaBetaMove(self, gs, validMoves, depth, alpha, beta, turnMultiplier):
+        self.counter += 1
+        if self.counter & 2047 == 0 or self.counter == self.maxNodes:
+            self.checkBudget()
+        if self.searchStopped:
+            return 0
+        #distance from the root, not searchDepth - depth: reductions take off more than one ply of depth per move
+        ply = len(gs.moveLog) - self.rootPly
+        #an exact result from the tablebases ends the search here (not at the root, where we still need a move)
+        if depth != self.searchDepth and self.inTablebases(gs):
+            result = gs.probeTablebase()
+            if result is not None:
+                self.stats.tablebaseHits += 1
+                return self.tablebaseScore(result, ply)
+        #always looking for maximum, negating it gives us black's best move, i.e. the minimum
+        if depth <= 0: #base case, reductions can overshoot it
+            if self.quiescence:
+                return self.quiescenceSearch(gs, validMoves, alpha, beta, turnMultiplier)
+            score = turnMultiplier * self.evaluate(gs)
+            return score + ply if score == -CHECKMATE else score #mated here, ply plies from the root
+
+        #transposition table lookup, a deep enough result can settle this node without searching it
+        #(not at the root, where we still need a move)
+        hashMoveID = None
+        entry = self.probe(gs.zobristKey)
+        if entry is not None:
+            hashMoveID = entry[4]
+            if entry[1] >= depth and depth != self.searchDepth:
+                score, flag = scoreFromTT(entry[2], ply), entry[3]
+                if flag == EXACT:
+                    self.stats.ttCutoffs += 1
+                    return score
+                elif flag == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                elif flag == UPPER_BOUND:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    self.stats.ttCutoffs += 1
+                    return score
+        #the bound stored at the end is for the window actually searched, which a stored bound may have narrowed:
+        #failing low against a raised alpha only shows the score is at most alpha, not that it's exact
+        alphaOrig = alpha
+
+        #in check every evasion is searched in full, no null move and no reductions
+        inCheck = depth >= REDUCTION_MIN_DEPTH and gs.inCheck()
+        #null move pruning: if passing still leaves the opponent unable to get below beta, a real move will too.
+        #not twice in a row, and not with only pawns left where having to move can be the problem (zugzwang)
+        if self.nullMovePruning and depth >= REDUCTION_MIN_DEPTH and depth != self.searchDepth and not inCheck and \
+                abs(beta) < MATE_BOUND and gs.moveLog[-1] is not NULL_MOVE and gs.hasNonPawnMaterial():
+            gs.makeNullMove()
+            nextMoves = None if self.stagedGeneration else self.generateMoves(gs)
+            score = -self.findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                                   -turnMultiplier)
+            gs.undoNullMove()
+            if self.searchStopped:
+                return 0
+            if score >= beta:
+                self.stats.nullMoveCutoffs += 1
+                return beta #a mate found after passing isn't a real one, so don't return the score itself
+
+        #move ordering - evaluate the best moves first, starting with the best move found here before
+        #without a move list (staged generation) the moves are generated in order, a stage at a time,
+        #unless the position's moves are cached already
+        if validMoves is None:
+            validMoves = gs.getCachedValidMoves()
+        if validMoves is None:
+            orderedMoves = self.stagedMoves(gs, hashMoveID, ply)
+        else:
+            orderedMoves = self.orderMoves(validMoves, hashMoveID, ply)
+
+        maxScore = -CHECKMATE
+        bestMove = None
+        moveNumber = -1
+        for moveNumber, move in enumerate(orderedMoves):
             gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, not whiteToMove)
-            if score < minScore:
-                minScore = score
-                if depth == DEPTH:
-                    nextMove = move
+            nextMoves = None if self.stagedGeneration else self.generateMoves(gs)
+            if moveNumber == 0:
+                score = -self.findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)     #recursive call
+            else:
+                #late move reductions: quiet moves this far down the ordering rarely turn out best, look at them less deeply
+                reduction = 0
+                if self.lateMoveReductions and moveNumber >= LMR_FULL_DEPTH_MOVES and depth >= REDUCTION_MIN_DEPTH and \
+                        not inCheck and not move.isCapture and not move.isPawnPromotion and not gs.inCheck():
+                    reduction = 1 if moveNumber < LMR_LATE_MOVES else 2
+                    self.stats.reductions += 1
+                #principal variation search: the first move is expected to be best, a zero window only proves the others
+                #are no better, which is cheaper than finding out by how much
+                windowBeta = alpha + 1 if self.pvs else beta
+                score = -self.findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1 - reduction, -windowBeta, -alpha,
+                                                       -turnMultiplier)
+                if reduction and score > alpha:
+                    self.stats.researches += 1
+                    score = -self.findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1, -windowBeta, -alpha, -turnMultiplier)
+                if windowBeta < beta and alpha < score < beta:
+                    self.stats.researches += 1
+                    score = -self.findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
             gs.undoMove()
-        return minScore
-
-def findNegaMaxMove(gs, validMoves, depth, turnMultiplier):
-    global nextMove, counter
-    counter += 1
-    #always looking for maximum, negating it gives us black's best move, i.e. the minimum
-    if depth == 0: #base case
-        return turnMultiplier * scoreBoard(gs)
-
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findNegaMaxMove(gs, nextMoves, depth - 1, -turnMultiplier)     #recursive call
-
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
+            if self.searchStopped:
+                return 0 #out of budget, this score is meaningless so don't store it
 
-        gs.undoMove()
-    return maxScore
-
-def findNegaMaxAlphaBetaMove(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    global counter
-    counter += 1
-    #always looking for maximum, negating it gives us black's best move, i.e. the minimum
-    if depth == 0: #base case
-        return turnMultiplier * scoreBoard(gs)
-
-    #move ordering - evaluate the best moves first
-    orderedMoves = orderMoves(gs, validMoves)
-
-    maxScore = -CHECKMATE
-    for move in orderedMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findNegaMaxAlphaBetaMove(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)     #recursive call
-
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-                print(nextMove,score)
-        gs.undoMove()
+            if score > maxScore:
+                maxScore = score
+                bestMove = move
+                if depth == self.searchDepth:
+                    self.nextMove = move
+                    self.nextScore = score
+
+            #pruning
+            if maxScore > alpha:
+                alpha = maxScore
+            if alpha >= beta:
+                self.stats.cutoffs += 1
+                if moveNumber == 0:
+                    self.stats.firstMoveCutoffs += 1
+                if not move.isCapture:
+                    self.updateQuietMoveScores(move, depth, ply)
+                break
+
+        if moveNumber < 0: #no legal moves
+            maxScore = -CHECKMATE + ply if gs.inCheck() else STALEMATE
+        if maxScore <= alphaOrig:
+            flag = UPPER_BOUND
+        elif maxScore >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transpositionTable.store(gs.zobristKey, depth, scoreToTT(maxScore, ply), flag,
+                                      bestMove.moveID if bestMove is not None else None)
+        return maxScore
 
-        #pruning
-        if maxScore > alpha:
-            alpha = maxScore
-        if alpha >= beta:
-            break
-    return maxScore
+    '''
+    Captures-only search at the leaves so the score is never taken in the middle of an exchange.
+    The side to move can always stand pat on the static score, captures are only searched to try and beat it.
+    '''
+    def quiescenceSearch(self, gs, validMoves, alpha, beta, turnMultiplier):
+        self.counter += 1
+        self.qCounter += 1
+        if self.counter & 2047 == 0 or self.counter == self.maxNodes:
+            self.checkBudget()
+        if self.searchStopped:
+            return 0
+        if validMoves is None:
+            if self.stagedGeneration:
+                validMoves = gs.getCachedValidMoves()
+            else:
+                validMoves = self.generateMoves(gs) #also caches the status scoreBoard looks at
+
+        standPat = turnMultiplier * self.evaluate(gs)
+        if standPat == -CHECKMATE:
+            standPat += len(gs.moveLog) - self.rootPly #mated here, count the plies so quicker mates score higher
+        if standPat >= beta:
+            return standPat
+        if validMoves is None:
+            #staged: only the captures are generated, and only the ones that get past the pruning are checked for legality
+            if gs.getGameStatus() != STATUS_ONGOING:
+                return standPat
+            captures, legality = self.generateCaptures(gs)
+        else:
+            if len(validMoves) == 0:
+                return standPat
+            captures = [move for move in validMoves if move.isCapture or move.isPawnPromotion]
+            legality = None
+        if standPat > alpha:
+            alpha = standPat
+
+        for move in self.orderMoves(captures, None, 0):
+            if self.deltaPruning and not move.isPawnPromotion and \
+                    standPat + pieceValues[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+                continue #even winning the piece for free can't raise alpha
+            if self.useSEE and not move.isPawnPromotion and staticExchangeEvaluation(gs, move) < 0:
+                continue #loses material once the exchange on that square is played out
+            if legality is not None and not gs.isLegal(move, legality[1], legality[2]):
+                continue
+            gs.makeMove(move)
+            score = -self.quiescenceSearch(gs, None, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+            if self.searchStopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def orderMoves(self, moves, hashMoveID, ply):
+        """
+        Order moves to improve alpha-beta pruning efficiency.
+        Priority: hash move > captures (most valuable victim, least valuable attacker) > killer moves > quiet moves by history
+        Each move is scored from its own fields, nothing is played on the board.
+        """
+        killers = self.killerMoves[ply]
+        history = self.history
+
+        def moveScore(move):
+            if move.moveID == hashMoveID:
+                return HASH_MOVE_SCORE
+            if move.isCapture or move.isPawnPromotion:
+                return captureScore(move)
+            if move.moveID == killers[0]:
+                return KILLER_SCORES[0]
+            if move.moveID == killers[1]:
+                return KILLER_SCORES[1]
+            return history[move.moveID] #the move id packs the from and to squares
+
+        return sorted(moves, key=moveScore, reverse=True)
+
+    '''
+    The legal moves of gs one at a time, in the order orderMoves would put them: the hash move, captures and
+    promotions, the killer moves, then the other quiet moves by history.
+    Each stage is only generated once the moves before it failed to cause a cutoff, and a move's legality is only
+    checked just before it is handed out, so a node that cuts off early doesn't pay for the moves it never searches.
+    '''
+    def stagedMoves(self, gs, hashMoveID, ply):
+        inCheck, pins, checkMask = gs.legalityMasks()
+        if hashMoveID is not None:
+            hashMove = gs.getMoveByID(hashMoveID, inCheck)
+            if hashMove is not None and gs.isLegal(hashMove, pins, checkMask):
+                yield hashMove
+
+        captures = gs.getCaptureMoves()
+        self.sortStage(captures, captureScore)
+        for move in captures:
+            if move.moveID != hashMoveID and gs.isLegal(move, pins, checkMask):
+                yield move
+
+        killers = tuple(self.killerMoves[ply]) #searching this node's moves can't change them, but keep a copy anyway
+        for killerID in killers:
+            if killerID is not None and killerID != hashMoveID:
+                move = gs.getMoveByID(killerID, inCheck)
+                #a killer that captures here was already searched with the captures
+                if move is not None and not move.isCapture and not move.isPawnPromotion and \
+                        gs.isLegal(move, pins, checkMask):
+                    yield move
+
+        quiets = gs.getQuietMoves(inCheck)
+        history = self.history
+        self.sortStage(quiets, lambda move: history[move.moveID])
+        for move in quiets:
+            if move.moveID != hashMoveID and move.moveID not in killers and gs.isLegal(move, pins, checkMask):
+                yield move
+
+    #sort one stage of stagedMoves best first, through the searcher so profiling can time it as ordering
+    def sortStage(self, moves, key):
+        moves.sort(key=key, reverse=True)
+
+    #a quiet move caused a cutoff: remember it as a killer for this ply and raise its history score
+    def updateQuietMoveScores(self, move, depth, ply):
+        killers = self.killerMoves[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        self.history[move.moveID] += depth * depth
+        if self.history[move.moveID] > HISTORY_LIMIT: #keep the scores in their band, halving keeps their order
+            self.history = [score // 2 for score in self.history]
+
+
+#plies to the mate a score stands for, found by the search or in the tablebases, None when it isn't a mate
+def matePlies(score):
+    distance = abs(score)
+    if distance > TABLEBASE_WIN:
+        return CHECKMATE - distance
+    if distance >= MATE_BOUND:
+        return TABLEBASE_WIN - distance
+    return None
+
+
+#the transposition table keeps a mate score as plies from its node instead of from the root, so it holds at any ply
+def scoreToTT(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def scoreFromTT(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+#the captures and promotions of a staged quiescence node, not yet checked for legality, and the masks to check them with
+def capturesAndLegality(gs):
+    return gs.getCaptureMoves(), gs.legalityMasks()
+
+
+#ordering score of a capture or promotion: most valuable victim first, then least valuable attacker
+def captureScore(move):
+    score = CAPTURE_SCORE - mvvLvaValues[move.pieceMoved[1]]
+    if move.isCapture:
+        score += 10 * mvvLvaValues[move.pieceCaptured[1]]
+    if move.isPawnPromotion:
+        score += 10 * mvvLvaValues["Q"]
+    return score
 
 
 '''A positive score is good for white, a negative score is good for black '''
 def scoreBoard(gs):
-    if gs.checkMate:
+    status = gs.getGameStatus()
+    if status == STATUS_CHECKMATE:
         if gs.whiteToMove:
             return -CHECKMATE #black wins
         else:
             return CHECKMATE #white wins
 
-    elif gs.staleMate:
+    elif status == STATUS_STALEMATE:
         return STALEMATE #neither side wins
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                #score it positionally
-                piecePositionScore = 0
-
-                if square[1] == 'K':
-                    piecePositionScore = piecePositionScores["K"][row][col] if square[0] == 'w' else piecePositionScores["K"][7 - row][col]
-                elif square[1] == 'p':
-                    piecePositionScore = piecePositionScores["p"][row][col] if square[0] == 'w' else piecePositionScores["p"][7 - row][col]
+    #material and piece-square totals are kept up to date by the game state as moves are made
+    score = gs.materialScore + gs.positionScore
 
-                if square[0] == 'w':
-                    score += pieceScores[square[1]]*10 + (piecePositionScore * 0.0003)
-                elif square[0] == 'b':
-                    score -= pieceScores[square[1]]*10 + (piecePositionScore * 0.0003)
-
-    # Penalize repetition
-    if len(gs.moveLog) >= 8 and gs.moveLog[-1].getChessNotation() == gs.moveLog[-3].getChessNotation():
-        score -= 5.0  # or larger depending on severity
+    # Penalize repetition: same position (same zobrist key) as two moves ago
+    if len(gs.moveLog) >= 8 and gs.zobristKey == gs.previousKey(4):
+        score -= REPETITION_PENALTY  # or larger depending on severity
     # Bonus for captured pieces in previous move
     if gs.moveLog:
         lastMove = gs.moveLog[-1]
         if lastMove.pieceCaptured != "--":
-            score += 0.2 if lastMove.pieceMoved[0] == 'w' else -0.2
+            score += CAPTURE_BONUS if lastMove.pieceMoved[0] == 'w' else -CAPTURE_BONUS
 
     return score
 
 
+'''
+Material won or lost by the side making the capture once every capture on the target square has been played out,
+each side capturing with its least valuable piece and free to stop when continuing would lose material
+'''
+def staticExchangeEvaluation(gs, move):
+    sq = move.endRow * 8 + move.endCol
+    fromBit = 1 << (move.startRow * 8 + move.startCol)
+    occupied = (gs.colorBitboards["w"] | gs.colorBitboards["b"]) ^ fromBit
+    gains = [seeValues[move.pieceCaptured[1]]]
+    pieceOnSquare = move.pieceMoved[1]
+    side = "b" if move.pieceMoved[0] == "w" else "w"
+    while True:
+        attackers = gs.attackersTo(sq, occupied) & occupied & gs.colorBitboards[side]
+        if not attackers:
+            break
+        for pieceType in "pNBRQK": #least valuable attacker first
+            pieceAttackers = attackers & gs.pieceBitboards[side + pieceType]
+            if pieceAttackers:
+                break
+        #the new capture wins the piece on the square but gives up whatever the exchange had won so far
+        gains.append(seeValues[pieceOnSquare] - gains[-1])
+        pieceOnSquare = pieceType
+        occupied ^= pieceAttackers & -pieceAttackers #taking the attacker off can uncover a slider behind it
+        side = "b" if side == "w" else "w"
+    #walk back, each side only continues the exchange when it pays
+    while len(gains) > 1:
+        lastGain = gains.pop()
+        gains[-1] = -max(-gains[-1], lastGain)
+    return gains[0]
+
+
 '''Score the board based on material alone, not checkmate'''
 def scoreMaterial(board):
     score = 0
@@ -229,50 +861,12 @@ def scoreMaterial(board):
         for square in row:
             if square != "--":
                 if square[0] == 'w':
-                    score += pieceScores[square[1]]
+                    score += pieceValues[square[1]]
                 elif square[0] == 'b':
-                    score -= pieceScores[square[1]]
+                    score -= pieceValues[square[1]]
 
     return score
 
 
-
-
-def orderMoves(gs, moves):
-    """
-    Order moves to improve alpha-beta pruning efficiency.
-    Priority: captures > checks > other moves
-    """
-    captures = []
-    checks = []
-    others = []
-
-    for move in moves:
-        gs.makeMove(move)
-
-        # Check if this move resulted in check
-        if gs.inCheck():
-            checks.append(move)
-        # Check if this was a capture (piece was taken)
-        elif move.pieceCaptured != "--":
-            captures.append(move)
-        else:
-            others.append(move)
-
-        gs.undoMove()
-
-    # Return captures first, then checks, then other moves
-    return captures + checks + others
-
-
-
-
-
-
-
-
-
-
-
-
-
+#the searcher behind findBestMove, created last since its hooks point at the functions above
+defaultSearcher = Searcher(transpositionTable)
@@ -0,0 +1,150 @@
+"""
+Batch analysis of position files without the GUI.
+Positions are streamed from a FEN or EPD file (one per line) to a pool of worker processes, each with its own
+Searcher, and the results are streamed back as JSON Lines. Re-running with the same output file skips the
+positions already in it, so an interrupted run picks up where it stopped.
+Run from the project root with: python -m Chess.ChessBatch positions.epd -o results.jsonl [--movetime 1] [--workers 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+PROGRESS_INTERVAL = 100 #positions between progress lines
+
+#one searcher per worker process, kept for every position it is handed
+workerSearcher = None
+
+
+'''
+Split a FEN or EPD line into (fen, id). EPD lines have four position fields followed by opcodes ("bm e4; id "x";"),
+they get a zero halfmove clock and move number one. Returns None for blank lines and comments.
+'''
+def parsePositionLine(line):
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    fields = line.split(None, 4)
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(None, 2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].isdigit():
+        return " ".join(fields[:4] + counters[:2]), None #FEN
+    positionId = None
+    for operation in rest.split(";"):
+        operation = operation.strip()
+        if operation.startswith("id "):
+            positionId = operation[3:].strip().strip('"')
+    return " ".join(fields[:4]) + " 0 1", positionId
+
+
+def initWorker(ttSizeMB):
+    global workerSearcher
+    from Chess import ChessAI
+    workerSearcher = ChessAI.Searcher(ttSizeMB=ttSizeMB, verbose=False)
+
+
+'''
+Search one position in a worker process, task is (index, fen, id, timeLimit, nodeLimit, depth)
+'''
+def analysePosition(task):
+    from Chess.ChessEngine import GameState, STATUS_CHECKMATE
+    index, fen, positionId, timeLimit, nodeLimit, depth = task
+    result = {"index": index, "id": positionId, "fen": fen}
+    startTime = time.perf_counter()
+    #a position the engine can't handle (a FEN it rejects, or an impossible one it accepts) is recorded as an
+    #error rather than taking the whole batch down
+    try:
+        gs = GameState.fromFEN(fen)
+        validMoves, status = gs.getValidMovesAndStatus()
+        if not validMoves:
+            result.update(bestMove=None, score=None, depth=0, nodes=0, seconds=0.0,
+                          result="checkmate" if status == STATUS_CHECKMATE else "stalemate")
+            return result
+        workerSearcher.transpositionTable.clear() #positions are unrelated, old entries would only take up slots
+        bestMove = workerSearcher.findBestMove(gs, validMoves, timeLimit, nodeLimit, depth)
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+        return result
+    result.update(bestMove=bestMove.getChessNotation() + ("q" if bestMove.isPawnPromotion else ""),
+                  score=workerSearcher.bestScore, depth=workerSearcher.completedDepth, nodes=workerSearcher.counter,
+                  seconds=round(time.perf_counter() - startTime, 4))
+    return result
+
+
+'''
+Indices of the positions already in an output file. A line cut off by an interruption is dropped from the file
+so the results appended after it start on a line of their own.
+'''
+def completedIndices(outputPath):
+    done = set()
+    if not os.path.exists(outputPath):
+        return done
+    with open(outputPath, "rb+") as outputFile:
+        data = outputFile.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            outputFile.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            done.add(json.loads(line)["index"])
+        except (ValueError, KeyError):
+            continue
+    return done
+
+
+def readTasks(inputFile, done, timeLimit, nodeLimit, depth):
+    for index, line in enumerate(inputFile):
+        if index in done:
+            continue
+        position = parsePositionLine(line)
+        if position is not None:
+            yield (index, position[0], position[1], timeLimit, nodeLimit, depth)
+
+
+def runBatch(inputPath, outputPath, workers=None, timeLimit=None, nodeLimit=None, depth=None, ttSizeMB=16):
+    workers = workers or os.cpu_count() or 1
+    done = completedIndices(outputPath)
+    if done:
+        print("resuming, %d positions already analysed" % len(done), file=sys.stderr)
+    inputFile = sys.stdin if inputPath == "-" else open(inputPath)
+    count = 0
+    startTime = time.perf_counter()
+    try:
+        with open(outputPath, "a") as outputFile, \
+                multiprocessing.Pool(workers, initializer=initWorker, initargs=(ttSizeMB,)) as pool:
+            for result in pool.imap_unordered(analysePosition, readTasks(inputFile, done, timeLimit, nodeLimit, depth)):
+                outputFile.write(json.dumps(result) + "\n")
+                outputFile.flush() #everything written is safe if the run is interrupted
+                count += 1
+                if count % PROGRESS_INTERVAL == 0:
+                    reportThroughput(count, time.perf_counter() - startTime, workers)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+    reportThroughput(count, time.perf_counter() - startTime, workers)
+    return count
+
+
+def reportThroughput(count, seconds, workers):
+    perSecond = count / seconds if seconds > 0 else 0.0
+    print("%d positions in %.1fs: %.2f positions/s, %.2f positions/s per core (%d workers)" %
+          (count, seconds, perSecond, perSecond / workers, workers), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a FEN or EPD file with a pool of searcher processes")
+    parser.add_argument("input", help="FEN or EPD file with one position per line, - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="JSON Lines results file, appended to and resumed from")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--movetime", type=float, help="seconds per position")
+    parser.add_argument("--nodes", type=int, help="nodes per position")
+    parser.add_argument("--depth", type=int, help="depth per position (default: the AI's DEPTH when there's no other budget)")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size per worker in MB")
+    args = parser.parse_args()
+    runBatch(args.input, args.output, args.workers, args.movetime, args.nodes, args.depth, args.hash)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmarks of the engine that run without the GUI.
+Run from the project root with: python -m Chess.ChessBenchmark [allocations|search] [--depth N]
+"""
+import argparse
+import time
+import tracemalloc
+
+from Chess.ChessEngine import GameState
+from Chess.ChessPerft import referencePositions
+
+#fixed positions for the search benchmarks (here and in ChessParallel): the start, middlegames with and without
+#castling rights and an endgame
+benchmarkPositions = [
+    referencePositions["startpos"][0],
+    referencePositions["kiwipete"][0],
+    referencePositions["position6"][0],
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1B1PPP/R2QKB1R w KQ - 0 8",
+    referencePositions["position3"][0],
+]
+#Searcher options of each search benchmark run, every feature on its own and then all of them together
+searchFeatures = {
+    "plain alpha-beta": {"pvs": False, "nullMovePruning": False, "lateMoveReductions": False, "aspirationWindows": ()},
+    "pvs": {"pvs": True, "nullMovePruning": False, "lateMoveReductions": False, "aspirationWindows": ()},
+    "null move": {"pvs": False, "nullMovePruning": True, "lateMoveReductions": False, "aspirationWindows": ()},
+    "lmr": {"pvs": False, "nullMovePruning": False, "lateMoveReductions": True, "aspirationWindows": ()},
+    "aspiration": {"pvs": False, "nullMovePruning": False, "lateMoveReductions": False},
+    "all": {},
+}
+
+
+'''
+Memory allocated for the move lists generated along a perft style walk of the game tree.
+Every list is kept alive until the end so the traced memory is everything a search would hand to the garbage collector.
+Returns (bytes, nodes, moves)
+'''
+def measureMoveAllocations(gs, depth):
+    moveLists = []
+
+    def walk(depthLeft):
+        moves = gs.generateValidMoves()[0]
+        moveLists.append(moves)
+        if depthLeft > 1:
+            for move in moves:
+                gs.makeMove(move)
+                walk(depthLeft - 1)
+                gs.undoMove()
+
+    tracemalloc.start()
+    startBytes = tracemalloc.get_traced_memory()[0]
+    walk(depth)
+    allocatedBytes = tracemalloc.get_traced_memory()[0] - startBytes
+    tracemalloc.stop()
+    return allocatedBytes, len(moveLists), sum(len(moves) for moves in moveLists)
+
+
+def allocationBenchmark(depth=3):
+    allocatedBytes, nodes, moves = measureMoveAllocations(GameState(), depth)
+    print("Move allocations, start position depth", depth)
+    print("  nodes:", nodes, " moves:", moves)
+    print("  bytes per move: %.1f  bytes per node: %.1f" % (allocatedBytes / moves, allocatedBytes / nodes))
+
+    gs = GameState()
+    startTime = time.perf_counter()
+    count = 0
+    while time.perf_counter() - startTime < 1.0:
+        count += len(gs.generateValidMoves()[0])
+    print("  moves generated per second: %d" % (count / (time.perf_counter() - startTime)))
+
+
+'''
+Nodes and time to search the benchmark positions to depth with each set of searchFeatures, and the share of the
+plain alpha-beta nodes each one saves. Every search starts from an empty transposition table and move cache.
+'''
+def searchBenchmark(depth=4):
+    from Chess.ChessAI import Searcher
+    print("Search, %d positions depth %d" % (len(benchmarkPositions), depth))
+    baseNodes = None
+    for name, options in searchFeatures.items():
+        nodes = 0
+        seconds = 0.0
+        moves = []
+        aspirationSearches = aspirationResearches = 0
+        for fen in benchmarkPositions:
+            GameState.moveCache.clear()
+            gs = GameState.fromFEN(fen)
+            searcher = Searcher(verbose=False, tablebases=False, **options)
+            move = searcher.findBestMove(gs, gs.getValidMoves(), depth=depth)
+            nodes += searcher.stats.nodes
+            seconds += searcher.stats.seconds
+            moves.append(move.getChessNotation())
+            aspirationSearches += searcher.stats.aspirationSearches
+            aspirationResearches += searcher.stats.aspirationFailLows + searcher.stats.aspirationFailHighs
+        if baseNodes is None:
+            baseNodes = nodes
+        print("  %-16s nodes %9d (%5.1f%% fewer)  %7.2fs  moves %s" %
+              (name, nodes, 100 * (1 - nodes / baseNodes), seconds, " ".join(moves)) +
+              ("  aspiration re-searches %d/%d" % (aspirationResearches, aspirationSearches) if aspirationSearches else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine benchmarks")
+    parser.add_argument("benchmark", nargs="?", choices=("allocations", "search"), default="allocations")
+    parser.add_argument("--depth", type=int, help="depth of the walk or search (default: 3 for allocations, 4 for search)")
+    args = parser.parse_args()
+    if args.benchmark == "search":
+        searchBenchmark(args.depth or 4)
+    else:
+        allocationBenchmark(args.depth or 3)
+
+
+if __name__ == '__main__':
+    main()
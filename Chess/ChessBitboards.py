@@ -0,0 +1,125 @@
+"""
+Precomputed bitboard tables and attack lookups used by the GameState.
+A bitboard is a python int where bit n is set when square n is occupied.
+Squares follow the layout of GameState.board: square = row * 8 + col, so a8 is bit 0 and h1 is bit 63.
+"""
+
+ALL_SQUARES = (1 << 64) - 1
+
+rookDirections = ((-1, 0), (1, 0), (0, -1), (0, 1))
+bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+knightOffsets = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+kingOffsets = rookDirections + bishopDirections
+
+
+def squareOf(r, c):
+    return r * 8 + c
+
+
+def rowColOf(sq):
+    return sq >> 3, sq & 7
+
+
+#squares of every set bit, lowest square first
+def bitSquares(bb):
+    squares = []
+    while bb:
+        lowestBit = bb & -bb
+        squares.append(lowestBit.bit_length() - 1)
+        bb ^= lowestBit
+    return squares
+
+
+def offsetAttacks(sq, offsets):
+    r, c = rowColOf(sq)
+    attacks = 0
+    for dr, dc in offsets:
+        endRow, endCol = r + dr, c + dc
+        if 0 <= endRow < 8 and 0 <= endCol < 8:
+            attacks |= 1 << squareOf(endRow, endCol)
+    return attacks
+
+
+#walk each ray from sq until it leaves the board or hits an occupied square (which is included)
+def slidingAttacks(sq, occupied, directions):
+    r, c = rowColOf(sq)
+    attacks = 0
+    for dr, dc in directions:
+        endRow, endCol = r + dr, c + dc
+        while 0 <= endRow < 8 and 0 <= endCol < 8:
+            bit = 1 << squareOf(endRow, endCol)
+            attacks |= bit
+            if occupied & bit:
+                break
+            endRow += dr
+            endCol += dc
+    return attacks
+
+
+#squares along the rays that can block a slider, the last square of every ray never matters
+def innerRayMask(sq, directions):
+    r, c = rowColOf(sq)
+    mask = 0
+    for dr, dc in directions:
+        endRow, endCol = r + dr, c + dc
+        while 0 <= endRow + dr < 8 and 0 <= endCol + dc < 8:
+            mask |= 1 << squareOf(endRow, endCol)
+            endRow += dr
+            endCol += dc
+    return mask
+
+
+knightAttacks = [offsetAttacks(sq, knightOffsets) for sq in range(64)]
+kingAttacks = [offsetAttacks(sq, kingOffsets) for sq in range(64)]
+#squares a pawn of the given color on sq attacks, white pawns move up the board towards row 0
+pawnAttacks = {"w": [offsetAttacks(sq, ((-1, -1), (-1, 1))) for sq in range(64)],
+               "b": [offsetAttacks(sq, ((1, -1), (1, 1))) for sq in range(64)]}
+
+
+#kindergarten style line lookups: a slider's attacks along one line (rank, file, diagonal or anti-diagonal)
+#only depend on the occupancy of at most 6 inner squares of that line, so every line of every square
+#gets a small table keyed by that masked occupancy
+lineDirections = (((0, -1), (0, 1)), ((-1, 0), (1, 0)), ((-1, -1), (1, 1)), ((-1, 1), (1, -1)))
+lineMasks = [[innerRayMask(sq, directions) for sq in range(64)] for directions in lineDirections]
+lineAttacks = []
+for lineIndex, directions in enumerate(lineDirections):
+    tables = []
+    for sq in range(64):
+        mask = lineMasks[lineIndex][sq]
+        table = {}
+        subset = 0
+        while True: #enumerate every subset of the mask
+            table[subset] = slidingAttacks(sq, subset, directions)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        tables.append(table)
+    lineAttacks.append(tables)
+
+rankMasks, fileMasks, diagonalMasks, antiDiagonalMasks = lineMasks
+rankAttacks, fileAttacks, diagonalAttacks, antiDiagonalAttacks = lineAttacks
+
+
+def rookAttacks(sq, occupied):
+    return rankAttacks[sq][occupied & rankMasks[sq]] | fileAttacks[sq][occupied & fileMasks[sq]]
+
+
+def bishopAttacks(sq, occupied):
+    return diagonalAttacks[sq][occupied & diagonalMasks[sq]] | antiDiagonalAttacks[sq][occupied & antiDiagonalMasks[sq]]
+
+
+def queenAttacks(sq, occupied):
+    return rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+
+
+#squares strictly between two squares on a common rank, file or diagonal, 0 when they don't line up
+betweenSquares = [[0] * 64 for _ in range(64)]
+for sq in range(64):
+    for dr, dc in kingOffsets:
+        r, c = rowColOf(sq)
+        between = 0
+        r, c = r + dr, c + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            betweenSquares[sq][squareOf(r, c)] = between
+            between |= 1 << squareOf(r, c)
+            r, c = r + dr, c + dc
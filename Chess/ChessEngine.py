@@ -3,7 +3,122 @@ Stores all info about the current game state.
 Also, responsible for determining the valid moves at the current state.
 Maintains a move log.
 """
+import threading
+from collections import OrderedDict
+
+from Chess.ChessBitboards import ALL_SQUARES, bitSquares, squareOf, knightAttacks, kingAttacks, pawnAttacks, \
+    rookAttacks, bishopAttacks, queenAttacks, betweenSquares
+from Chess.ChessZobrist import pieceKeys, blackToMoveKey, castlingKeys, enPassantKeys, computeKeys
+from Chess.ChessEvaluation import materialScores, positionScores, computeScores
+from Chess import ChessTablebase
+
+#FEN piece letters, white upper case and black lower case
+fenPieces = {"P": "wp", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+             "p": "bp", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK"}
+fenLetters = {v: k for k, v in fenPieces.items()}
+
+#castling rights packed into 4 bits, as CastleRights.toBits and the zobrist castling keys have them
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = 15
+#rights lost by a move that starts or ends on a square, i.e. the king and rook home squares
+castlingRightsLost = [0] * 64
+castlingRightsLost[squareOf(7, 4)] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+castlingRightsLost[squareOf(7, 7)] = WHITE_KINGSIDE
+castlingRightsLost[squareOf(7, 0)] = WHITE_QUEENSIDE
+castlingRightsLost[squareOf(0, 4)] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+castlingRightsLost[squareOf(0, 7)] = BLACK_KINGSIDE
+castlingRightsLost[squareOf(0, 0)] = BLACK_QUEENSIDE
+
+#undo stack: one record per move made, holding the state the move itself can't give back
+#the records sit end to end in one flat list allocated up front and are overwritten in place,
+#so making and undoing moves allocates nothing
+UNDO_STACK_SIZE = 128 #records per game state to start with, the list grows if a game runs longer
+#slots of a record
+UNDO_CASTLING_BITS = 0
+UNDO_EN_PASSANT = 1
+UNDO_HALFMOVE_CLOCK = 2
+UNDO_ZOBRIST_KEY = 3
+UNDO_PAWN_KEY = 4
+UNDO_MATERIAL_SCORE = 5
+UNDO_POSITION_SCORE = 6
+UNDO_RECORD_SIZE = 7
+
+#parsed FEN ranks by their text, the same few ranks turn up again and again when loading many positions
+fenRankRows = {}
+FEN_RANK_CACHE_SIZE = 100000
+
+#game status, returned along with the legal moves
+STATUS_ONGOING = 0
+STATUS_CHECKMATE = 1 #the side to move is mated
+STATUS_STALEMATE = 2
+MOVE_CACHE_SIZE = 8192 #positions whose legal moves are kept, a list of moves takes about 3KB
+
+
+def parseFENRank(rank):
+    row = []
+    for char in rank:
+        if char in fenPieces:
+            row.append(fenPieces[char])
+        elif "1" <= char <= "8":
+            row.extend(["--"] * int(char))
+        else:
+            raise ValueError("Invalid character in FEN rank: " + rank)
+    if len(row) != 8:
+        raise ValueError("FEN rank doesn't have 8 squares: " + rank)
+    return tuple(row)
+
+
+'''
+Bounded least recently used cache of (legal moves, status) by zobrist key.
+A position's legal moves don't depend on how it was reached, so an entry stays good through any number of
+makeMove/undoMove calls, and across game states: one cache is shared by every GameState in the process.
+Searchers in other threads use it at the same time, so every access holds the cache's lock.
+'''
+class LegalMoveCache:
+    def __init__(self, size=MOVE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hitRate(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+
 class GameState:
+    #when True every makeMove/undoMove checks the incremental zobrist keys against a full recompute
+    debugHash = False
+    #when True every makeMove/undoMove checks the incremental material and piece-square totals against a full recompute
+    debugEval = False
+    #legal moves and status of recently seen positions, see getValidMovesAndStatus
+    moveCache = LegalMoveCache()
+
     def __init__(self):
         #board is a 8x8 2-D List
         #each element has two characters, first character represents the color of the piece.
@@ -19,31 +134,213 @@ class GameState:
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
-
-
-
-        self.whiteToMove = True
+        self.setupPosition(self.board, True, ALL_CASTLING_RIGHTS, (), 0, 1)
+
+    #build a game state from a FEN string without setting up the start position first, fast enough for bulk loading
+    @classmethod
+    def fromFEN(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks: " + fen)
+        board = []
+        for rank in ranks:
+            row = fenRankRows.get(rank)
+            if row is None:
+                row = parseFENRank(rank)
+                if len(fenRankRows) < FEN_RANK_CACHE_SIZE:
+                    fenRankRows[rank] = row
+            board.append(list(row))
+        #positions the move generator can't handle: a pawn with no square ahead of it, or a side without one king
+        if "wp" in board[0] or "wp" in board[7] or "bp" in board[0] or "bp" in board[7]:
+            raise ValueError("FEN has a pawn on the first or last rank: " + fen)
+        for king in ("wK", "bK"):
+            if sum(row.count(king) for row in board) != 1:
+                raise ValueError("FEN needs exactly one king per side: " + fen)
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be w or b: " + fen)
+        rights = fields[2]
+        castlingBits = ("K" in rights) * WHITE_KINGSIDE | ("Q" in rights) * WHITE_QUEENSIDE | \
+            ("k" in rights) * BLACK_KINGSIDE | ("q" in rights) * BLACK_QUEENSIDE
+        enPassant = ()
+        if fields[3] != "-":
+            if len(fields[3]) != 2 or fields[3][0] not in Move.filesToCols or fields[3][1] not in Move.ranksToRows:
+                raise ValueError("FEN en passant square is invalid: " + fen)
+            if fields[3][1] not in ("3", "6"):
+                raise ValueError("FEN en passant square must be on rank 3 or 6: " + fen)
+            enPassant = (Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]])
+        halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        gs = cls.__new__(cls)
+        gs.setupPosition(board, fields[1] == "w", castlingBits, enPassant, halfmoveClock, fullmoveNumber)
+        return gs
+
+    def toFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += fenLetters[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = "".join(letter for letter, bit in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE),
+                                                      ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+                           if self.castlingBits & bit)
+        enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]] \
+            if self.enPassantPossible else "-"
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enPassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
+
+    #set every piece of state for a position with no move history, shared by __init__ and fromFEN
+    def setupPosition(self, board, whiteToMove, castlingBits, enPassant, halfmoveClock, fullmoveNumber):
+        self.board = board
+        self.whiteToMove = whiteToMove
         self.moveLog = []
         self.whiteKingLocation = (7,4)
         self.blackKingLocation = (0,4)
-        self.checkMate = False
-        self.staleMate = False
-        self.enPassantPossible = () #coordinatees for the square where the en passant is possible
-        self.enPassantPossibleLog = [self.enPassantPossible]
-        self.currentCastlingRights = CastleRights(wks=True, bks=True, wqs=True, bqs=True)
-        self.castleRightsLog = [CastleRights(wks=self.currentCastlingRights.wks,
-                                             bks=self.currentCastlingRights.bks,
-                                             wqs=self.currentCastlingRights.wqs,
-                                             bqs=self.currentCastlingRights.bqs)]
-
-
+        for r in range(8):
+            if "wK" in board[r]:
+                self.whiteKingLocation = (r, board[r].index("wK"))
+            if "bK" in board[r]:
+                self.blackKingLocation = (r, board[r].index("bK"))
+        self.enPassantPossible = enPassant #coordinatees for the square where the en passant is possible
+        self.castlingBits = castlingBits #WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        #moves since the last capture or pawn move (for the fifty move rule) and the move number, as in FEN
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        self.undoStack = [None] * (UNDO_STACK_SIZE * UNDO_RECORD_SIZE)
+
+        #bitboards mirror the board list, one per piece plus an occupancy board per color
+        #move generation and attack detection run on these, the board list stays as the view of the position
+        self.pieceBitboards = {}
+        self.colorBitboards = {}
+        #zobrist key of the position and of its pawns alone, updated with every move
+        self.zobristKey = 0
+        self.pawnKey = 0
+        #material and piece-square totals in centipawns, white minus black, updated with every move
+        self.materialScore = 0
+        self.positionScore = 0
+        self.syncFromBoard()
 
         self.moveFunctions = {"p" : self.getPawnMoves, "N" : self.getKnightMoves, "B" : self.getBishopMoves,
                               "Q" : self.getQueenMoves, "K" : self.getKingMoves, "R" : self.getRookMoves,}
 
+    #rebuild the bitboards, hash keys and evaluation totals from the board list, side to move, castling rights and en passant square
+    #needed after a position is set up by editing those directly
+    def syncFromBoard(self):
+        #one pass over the board fills everything in, computeKeys and computeScores stay as the reference versions
+        pieceBitboards = {color + pieceType: 0 for color in "wb" for pieceType in "pNBRQK"}
+        colorBitboards = {"w": 0, "b": 0}
+        key = pawnKey = material = position = 0
+        sq = 0
+        for row in self.board:
+            for piece in row:
+                if piece != "--":
+                    pieceBitboards[piece] |= 1 << sq
+                    colorBitboards[piece[0]] |= 1 << sq
+                    key ^= pieceKeys[piece][sq]
+                    if piece[1] == 'p':
+                        pawnKey ^= pieceKeys[piece][sq]
+                    material += materialScores[piece]
+                    position += positionScores[piece][sq]
+                sq += 1
+        if not self.whiteToMove:
+            key ^= blackToMoveKey
+        key ^= castlingKeys[self.castlingBits]
+        if self.enPassantPossible:
+            key ^= enPassantKeys[self.enPassantPossible[1]]
+        self.pieceBitboards = pieceBitboards
+        self.colorBitboards = colorBitboards
+        self.zobristKey, self.pawnKey = key, pawnKey
+        self.materialScore, self.positionScore = material, position
+
+    #the castling rights as a CastleRights object, a copy: changing it doesn't change the game state
+    @property
+    def currentCastlingRights(self):
+        return CastleRights.fromBits(self.castlingBits)
+
+    #zobrist key of the position plies moves back, at most len(moveLog)
+    def previousKey(self, plies):
+        return self.undoStack[(len(self.moveLog) - plies) * UNDO_RECORD_SIZE + UNDO_ZOBRIST_KEY]
+
+    #put a piece (or "--") on a square, keeping the board list, the bitboards, the hash keys and the evaluation in step
+    def setSquare(self, r, c, piece):
+        sq = r * 8 + c
+        bit = 1 << sq
+        oldPiece = self.board[r][c]
+        if oldPiece != "--":
+            self.pieceBitboards[oldPiece] ^= bit
+            self.colorBitboards[oldPiece[0]] ^= bit
+            self.zobristKey ^= pieceKeys[oldPiece][sq]
+            if oldPiece[1] == 'p':
+                self.pawnKey ^= pieceKeys[oldPiece][sq]
+            self.materialScore -= materialScores[oldPiece]
+            self.positionScore -= positionScores[oldPiece][sq]
+        if piece != "--":
+            self.pieceBitboards[piece] ^= bit
+            self.colorBitboards[piece[0]] ^= bit
+            self.zobristKey ^= pieceKeys[piece][sq]
+            if piece[1] == 'p':
+                self.pawnKey ^= pieceKeys[piece][sq]
+            self.materialScore += materialScores[piece]
+            self.positionScore += positionScores[piece][sq]
+        self.board[r][c] = piece
+
+    #compare the incremental hash keys with a full recompute, used when debugHash is on
+    def checkHashKeys(self):
+        key, pawnKey = computeKeys(self)
+        if key != self.zobristKey or pawnKey != self.pawnKey:
+            raise RuntimeError("Incremental zobrist key is out of sync after " +
+                               (self.moveLog[-1].getChessNotation() if self.moveLog else "setup"))
+
+    #compare the incremental evaluation totals with a full recompute, used when debugEval is on
+    def checkEvalScores(self):
+        if computeScores(self) != (self.materialScore, self.positionScore):
+            raise RuntimeError("Incremental evaluation is out of sync after " +
+                               (self.moveLog[-1].getChessNotation() if self.moveLog else "setup"))
+
+    #save what undoMove can't work out from the move into the next record of the undo stack, before the move is logged
+    def pushUndoRecord(self):
+        stack = self.undoStack
+        i = len(self.moveLog) * UNDO_RECORD_SIZE
+        if i == len(stack):
+            stack.extend([None] * (UNDO_STACK_SIZE * UNDO_RECORD_SIZE))
+        stack[i + UNDO_CASTLING_BITS] = self.castlingBits
+        stack[i + UNDO_EN_PASSANT] = self.enPassantPossible
+        stack[i + UNDO_HALFMOVE_CLOCK] = self.halfmoveClock
+        stack[i + UNDO_ZOBRIST_KEY] = self.zobristKey
+        stack[i + UNDO_PAWN_KEY] = self.pawnKey
+        stack[i + UNDO_MATERIAL_SCORE] = self.materialScore
+        stack[i + UNDO_POSITION_SCORE] = self.positionScore
+
+    #restore the state saved by pushUndoRecord, after the move is taken off the log
+    def popUndoRecord(self):
+        stack = self.undoStack
+        i = len(self.moveLog) * UNDO_RECORD_SIZE
+        self.castlingBits = stack[i + UNDO_CASTLING_BITS]
+        self.enPassantPossible = stack[i + UNDO_EN_PASSANT]
+        self.halfmoveClock = stack[i + UNDO_HALFMOVE_CLOCK]
+        self.zobristKey = stack[i + UNDO_ZOBRIST_KEY]
+        self.pawnKey = stack[i + UNDO_PAWN_KEY]
+        self.materialScore = stack[i + UNDO_MATERIAL_SCORE]
+        self.positionScore = stack[i + UNDO_POSITION_SCORE]
+
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        oldCastleBits = self.castlingBits
+        oldEnPassant = self.enPassantPossible
+        self.pushUndoRecord()
+        self.setSquare(move.startRow, move.startCol, "--")
+        self.setSquare(move.endRow, move.endCol, move.pieceMoved)
         self.moveLog.append(move) #log the move to undo it later or display history of the game.
         self.whiteToMove = not self.whiteToMove  # swap turns
         if move.pieceMoved == 'wK':
@@ -53,21 +350,21 @@ class GameState:
 
         #pawn promotion
         if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] +'Q'
+            self.setSquare(move.endRow, move.endCol, move.pieceMoved[0] +'Q')
 
         #castling move
         if move.isCastleMove:
             if move.endCol - move.startCol == 2: #king side castle
-                self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]
-                self.board[move.endRow][move.endCol + 1] = "--"  # Clear the old rook
+                self.setSquare(move.endRow, move.endCol - 1, self.board[move.endRow][move.endCol + 1])
+                self.setSquare(move.endRow, move.endCol + 1, "--")  # Clear the old rook
             else: #queen side castle
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]
-                self.board[move.endRow][move.endCol-2] = "--"
+                self.setSquare(move.endRow, move.endCol+1, self.board[move.endRow][move.endCol-2])
+                self.setSquare(move.endRow, move.endCol-2, "--")
 
 
         # enpassant move
         if move.isEnPassantMove:
-            self.board[move.startRow][move.endCol]= '--'  # capturing the pawn
+            self.setSquare(move.startRow, move.endCol, '--')  # capturing the pawn
 
         #update is enpassantPossible variable
         if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2: #only when pawn moves 2 squares
@@ -77,17 +374,32 @@ class GameState:
 
         #update the castling rights: when a king or rook is moved
         self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
 
-        self.enPassantPossibleLog.append(self.enPassantPossible)
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'p' or move.isCapture else self.halfmoveClock + 1
+        if self.whiteToMove: #black just moved
+            self.fullmoveNumber += 1
+
+        #the pieces are already hashed by setSquare, add the side to move, castling rights and en passant file
+        self.zobristKey ^= blackToMoveKey ^ castlingKeys[oldCastleBits] ^ castlingKeys[self.castlingBits]
+        if oldEnPassant:
+            self.zobristKey ^= enPassantKeys[oldEnPassant[1]]
+        if self.enPassantPossible:
+            self.zobristKey ^= enPassantKeys[self.enPassantPossible[1]]
+        if self.debugHash:
+            self.checkHashKeys()
+        if self.debugEval:
+            self.checkEvalScores()
 
     #undo the last made move
     def undoMove(self):
         if len(self.moveLog) > 0: #make sure move log is not empty, there should be a move to undo
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved #put the piece moved onto the prev square
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            self.setSquare(move.startRow, move.startCol, move.pieceMoved) #put the piece moved onto the prev square
+            if move.isEnPassantMove:
+                self.setSquare(move.endRow, move.endCol, '--') #leave the capture square blank
+                self.setSquare(move.startRow, move.endCol, move.pieceCaptured)
+            else:
+                self.setSquare(move.endRow, move.endCol, move.pieceCaptured)
 
             self.whiteToMove = not self.whiteToMove  # change turns back
 
@@ -99,117 +411,206 @@ class GameState:
                 self.blackKingLocation = (move.startRow, move.startCol)
 
 
-            #undo enpassant
-            if move.isEnPassantMove:
-                self.board[move.endRow][move .endCol] = '--' #leave the capture square black
-                self.board[move.startRow][move.endCol]= move.pieceCaptured
-
-
-            self.enPassantPossibleLog.pop()
-            self.enPassantPossible = self.enPassantPossibleLog[-1]
-
-
-            #undo castling rights
-            self.castleRightsLog.pop()  # get rid of new castle rights from the move that we're doing
-            # Fixed castling rights restoration
-            if len(self.castleRightsLog) > 0:
-                prevRights = self.castleRightsLog[-1]
-                # Create a NEW object instead of referencing the same one
-                self.currentCastlingRights = CastleRights(
-                    prevRights.wks, prevRights.bks,
-                    prevRights.wqs, prevRights.bqs
-                )
-            else:
-                self.currentCastlingRights = CastleRights(True, True, True, True)
+            if not self.whiteToMove: #undoing a black move
+                self.fullmoveNumber -= 1
 
 
             #undo the castle move
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  # kingside
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = "--"
+                    self.setSquare(move.endRow, move.endCol + 1, self.board[move.endRow][move.endCol - 1])
+                    self.setSquare(move.endRow, move.endCol - 1, "--")
 
                 else:  # queenside
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = "--"
+                    self.setSquare(move.endRow, move.endCol - 2, self.board[move.endRow][move.endCol + 1])
+                    self.setSquare(move.endRow, move.endCol + 1, "--")
+
+            #castling rights, en passant square, clock, hash keys and evaluation totals of the previous position
+            self.popUndoRecord()
+            if self.debugHash:
+                self.checkHashKeys()
+            if self.debugEval:
+                self.checkEvalScores()
+
+    '''
+    Pass the turn without moving, for null move pruning in the search. Only the side to move, the en passant square
+    and the clock change. NULL_MOVE goes into the move log to keep it in step with the undo stack, so the previous
+    position keys still line up. Take it back with undoNullMove, not undoMove.
+    '''
+    def makeNullMove(self):
+        self.pushUndoRecord()
+        self.moveLog.append(NULL_MOVE)
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= blackToMoveKey
+        if self.enPassantPossible:
+            self.zobristKey ^= enPassantKeys[self.enPassantPossible[1]]
+            self.enPassantPossible = ()
+        self.halfmoveClock += 1
 
-            self.checkMate = False
-            self.staleMate = False
+    def undoNullMove(self):
+        self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        self.popUndoRecord()
 
 
-    #function to update the castle rights
+    #function to update the castle rights: a king or rook leaving its home square, or a rook captured on it
     def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRights.wks = False
-            self.currentCastlingRights.wqs = False
-
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRights.bks = False
-            self.currentCastlingRights.bqs = False
-
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:
-                    self.currentCastlingRights.wqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRights.wks = False
-
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:
-                    self.currentCastlingRights.bqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRights.bks = False
-
-        #if a rook is captured
-        if move.pieceCaptured == 'wR':
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRights.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRights.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.bks = False
-
+        lost = castlingRightsLost[move.startRow * 8 + move.startCol] | castlingRightsLost[move.endRow * 8 + move.endCol]
+        if self.castlingBits & lost:
+            self.castlingBits &= ~lost
+
+
+    '''
+    Legal moves and the game status (STATUS_ONGOING, STATUS_CHECKMATE or STATUS_STALEMATE) of the position,
+    from the move cache when the position was seen lately. The list is the caller's own copy, free to reorder.
+    '''
+    def getValidMovesAndStatus(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is None or entry[0] is None: #not cached, or only the status is
+            entry = self.generateValidMoves()
+            self.moveCache.put(self.zobristKey, entry)
+        return list(entry[0]), entry[1]
 
     def getValidMoves(self):
-        tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights  = CastleRights(self.currentCastlingRights.wks,self.currentCastlingRights.bks,
-                                         self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
-        #1 generate all moves
+        return self.getValidMovesAndStatus()[0]
+
+    #a copy of the legal moves if the position is in the move cache, else None without generating them
+    def getCachedValidMoves(self):
+        entry = self.moveCache.get(self.zobristKey)
+        return list(entry[0]) if entry is not None and entry[0] is not None else None
+
+    #the status alone is cached as (None, status) when the moves weren't needed
+    def getGameStatus(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is None:
+            entry = (None, self.generateStatus())
+            self.moveCache.put(self.zobristKey, entry)
+        return entry[1]
+
+    #the game status without the cache, found by looking for one legal move, captures first, instead of all of them
+    def generateStatus(self):
+        inCheck, pins, checkMask = self.legalityMasks()
+        for move in self.getCaptureMoves():
+            if self.isLegal(move, pins, checkMask):
+                return STATUS_ONGOING
+        for move in self.getQuietMoves(inCheck):
+            if self.isLegal(move, pins, checkMask):
+                return STATUS_ONGOING
+        return STATUS_CHECKMATE if inCheck else STATUS_STALEMATE
+
+    #kept for readers of the old flags, both are worked out from the status of the current position
+    @property
+    def checkMate(self):
+        return self.getGameStatus() == STATUS_CHECKMATE
+
+    @property
+    def staleMate(self):
+        return self.getGameStatus() == STATUS_STALEMATE
+
+    #generate the legal moves without the cache, returns (tuple of moves, status)
+    def generateValidMoves(self):
+        #1 find the pins on our pieces and the checks against our king, once for the whole position
+        inCheck, pins, checkMask = self.legalityMasks()
+
+        #2 generate all moves
         moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        #2 make the move
-        for i in range(len(moves) - 1, -1, -1):  # when removing from a list go backwards through that list
-            self.makeMove(moves[i])
-
-        #3 generate all opponents moves,
+        if not inCheck:
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            self.getCastleMoves(kingRow, kingCol, moves)
+
+        #3 keep only the moves that don't leave our king in check
+        #the checks of isLegal, inlined for the common cases since this runs for every move generated
+        validMoves = []
+        for move in moves:
+            if move.pieceMoved[1] == 'K' or move.isEnPassantMove:
+                if self.isLegal(move, pins, checkMask):
+                    validMoves.append(move)
+            else:
+                endBit = 1 << (move.endRow * 8 + move.endCol)
+                if not endBit & checkMask:
+                    continue
+                pinRay = pins.get(move.startRow * 8 + move.startCol)
+                if pinRay is None or endBit & pinRay:
+                    validMoves.append(move)
 
-        #4 see if they attack your king
+        #checkmate or stalemate
+        if validMoves:
+            status = STATUS_ONGOING
+        else:
+            status = STATUS_CHECKMATE if inCheck else STATUS_STALEMATE
+        return tuple(validMoves), status
+
+    '''
+    What isLegal needs to know about the position: whether the side to move is in check, the pinned squares with
+    the squares they may still move to, and the squares a non king move has to land on: anywhere when not in check,
+    capture the checker or block the ray on a single check, nowhere on a double check
+    '''
+    def legalityMasks(self):
+        inCheck, pins, checkers = self.checkForPinsAndChecks()
+        if checkers == 0:
+            checkMask = ALL_SQUARES
+        elif checkers & (checkers - 1):
+            checkMask = 0
+        else:
+            kingSq = squareOf(*(self.whiteKingLocation if self.whiteToMove else self.blackKingLocation))
+            checkMask = checkers | betweenSquares[kingSq][checkers.bit_length() - 1]
+        return inCheck, pins, checkMask
+
+    #does a pseudo legal move leave our king out of check, given the legalityMasks of the position
+    def isLegal(self, move, pins, checkMask):
+        if move.pieceMoved[1] == 'K':
+            return move.isCastleMove or not self.kingMoveIntoCheck(move)
+        if move.isEnPassantMove:
+            #both pawns leave their squares, which can uncover a check along the rank, so play it out
+            self.makeMove(move)
             self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])
+            legal = not self.inCheck()
             self.whiteToMove = not self.whiteToMove
             self.undoMove()
-
-        #checkmate or stalemate
-        if len(moves) == 0:
-            if self.inCheck():
-                self.checkMate = True
-            else:
-                self.staleMate = True
-
-        #5 if they do attack the king, not a valid move
-        self.enPassantPossible = tempEnPassantPossible
-        self.currentCastlingRights = tempCastleRights
-        return moves
+            return legal
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        if not endBit & checkMask:
+            return False
+        #a pinned piece may only move along the squares between the king and the pinning piece, or capture it
+        pinRay = pins.get(move.startRow * 8 + move.startCol)
+        return pinRay is None or endBit & pinRay != 0
+
+    #look for enemy pieces that attack the king of the side to move, directly or through one of our pieces
+    #returns if the king is in check, a dict of pinned squares to the squares they may still move to,
+    #and a bitboard of the checking pieces
+    def checkForPinsAndChecks(self):
+        pins = {}
+        if self.whiteToMove:
+            enemyColor, allyColor = "b", "w"
+            kingSq = squareOf(*self.whiteKingLocation)
+        else:
+            enemyColor, allyColor = "w", "b"
+            kingSq = squareOf(*self.blackKingLocation)
+        bb = self.pieceBitboards
+        allies = self.colorBitboards[allyColor]
+        occupied = allies | self.colorBitboards[enemyColor]
+
+        checkers = (knightAttacks[kingSq] & bb[enemyColor + 'N']) | (pawnAttacks[allyColor][kingSq] & bb[enemyColor + 'p'])
+
+        #every enemy slider that would see the king on an empty board, then look at what stands in between
+        enemyQueens = bb[enemyColor + 'Q']
+        sliders = (rookAttacks(kingSq, 0) & (bb[enemyColor + 'R'] | enemyQueens)) | \
+                  (bishopAttacks(kingSq, 0) & (bb[enemyColor + 'B'] | enemyQueens))
+        for sq in bitSquares(sliders):
+            blockers = betweenSquares[kingSq][sq] & occupied
+            if blockers == 0: #no piece blocking, so check
+                checkers |= 1 << sq
+            elif blockers & (blockers - 1) == 0 and blockers & allies: #exactly one of our pieces blocking, so pin
+                pins[blockers.bit_length() - 1] = betweenSquares[kingSq][sq] | (1 << sq)
+
+        return checkers != 0, pins, checkers
+
+    #checks if a (non castling) king move would leave the king attacked
+    def kingMoveIntoCheck(self, move):
+        enemyColor = "b" if self.whiteToMove else "w"
+        #lift the king off its square so it can't shield the destination from sliders behind it
+        occupied = (self.colorBitboards["w"] | self.colorBitboards["b"]) ^ (1 << squareOf(move.startRow, move.startCol))
+        return self.isAttackedBy(move.endRow, move.endCol, enemyColor, occupied)
 
 
     def inCheck(self):
@@ -218,176 +619,249 @@ class GameState:
         else:
             return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
 
+    #does the side to move have anything besides its king and pawns, without it a null move can miss a zugzwang
+    def hasNonPawnMaterial(self):
+        color = "w" if self.whiteToMove else "b"
+        return self.colorBitboards[color] != self.pieceBitboards[color + "p"] | self.pieceBitboards[color + "K"]
+
+    #number of pieces on the board, kings included
+    def pieceCount(self):
+        return bin(self.colorBitboards["w"] | self.colorBitboards["b"]).count("1")
+
+    #endgame tablebase result, (WIN, DRAW or LOSS for the side to move, plies to mate) or None outside the tables
+    def probeTablebase(self):
+        return ChessTablebase.probe(self)
+
+    #is the square (r,c) attacked by the opponent of the side to move
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
-                return True
-        return False
+        return self.isAttackedBy(r, c, "b" if self.whiteToMove else "w")
+
+    #batched form of squareUnderAttack, returns the set of the given squares that the opponent attacks
+    #the opponent's attacks are worked out once for the whole board and every square is looked up in them
+    def squaresUnderAttack(self, squares):
+        attacked = self.attackedSquares("b" if self.whiteToMove else "w")
+        return {(r, c) for r, c in squares if attacked >> (r * 8 + c) & 1}
+
+    #bitboard of every square a piece of color attacks, sliders stop at the first piece in their way
+    def attackedSquares(self, color, occupied=None):
+        bb = self.pieceBitboards
+        if occupied is None:
+            occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        attacks = 0
+        for sq in bitSquares(bb[color + "K"]):
+            attacks |= kingAttacks[sq]
+        pawnTargets = pawnAttacks[color]
+        for sq in bitSquares(bb[color + "p"]):
+            attacks |= pawnTargets[sq]
+        for sq in bitSquares(bb[color + "N"]):
+            attacks |= knightAttacks[sq]
+        for sq in bitSquares(bb[color + "B"] | bb[color + "Q"]):
+            attacks |= bishopAttacks(sq, occupied)
+        for sq in bitSquares(bb[color + "R"] | bb[color + "Q"]):
+            attacks |= rookAttacks(sq, occupied)
+        return attacks
+
+    #bitboard of every piece, of either color, that attacks square sq given the occupied squares
+    #passing a reduced occupancy reveals the pieces standing behind the attackers that were taken out
+    def attackersTo(self, sq, occupied):
+        bb = self.pieceBitboards
+        rooksAndQueens = bb["wR"] | bb["bR"] | bb["wQ"] | bb["bQ"]
+        bishopsAndQueens = bb["wB"] | bb["bB"] | bb["wQ"] | bb["bQ"]
+        return (knightAttacks[sq] & (bb["wN"] | bb["bN"])) | (kingAttacks[sq] & (bb["wK"] | bb["bK"])) | \
+               (pawnAttacks["b"][sq] & bb["wp"]) | (pawnAttacks["w"][sq] & bb["bp"]) | \
+               (rookAttacks(sq, occupied) & rooksAndQueens) | (bishopAttacks(sq, occupied) & bishopsAndQueens)
+
+    #look outwards from (r,c) for a piece of enemyColor that attacks it, stops at the first attacker found
+    def isAttackedBy(self, r, c, enemyColor, occupied=None):
+        sq = r * 8 + c
+        bb = self.pieceBitboards
+        if occupied is None:
+            occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        #an enemy pawn attacks sq from the squares one of our pawns on sq would attack
+        allyColor = "w" if enemyColor == "b" else "b"
+        if knightAttacks[sq] & bb[enemyColor + 'N'] or pawnAttacks[allyColor][sq] & bb[enemyColor + 'p'] or \
+                kingAttacks[sq] & bb[enemyColor + 'K']:
+            return True
+        enemyQueens = bb[enemyColor + 'Q']
+        if bishopAttacks(sq, occupied) & (bb[enemyColor + 'B'] | enemyQueens):
+            return True
+        return rookAttacks(sq, occupied) & (bb[enemyColor + 'R'] | enemyQueens) != 0
 
     def getAllPossibleMoves(self):
         moves = []
-        for c in range(len(self.board[0])):  # cols
-            for r in range(len(self.board)):  # rows
-                turn = self.board[r][c][0]
-                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)
+        color = "w" if self.whiteToMove else "b"
+        for pieceType in "pNBRQK":
+            for sq in bitSquares(self.pieceBitboards[color + pieceType]):
+                self.moveFunctions[pieceType](sq >> 3, sq & 7, moves)
         return moves
 
+    #pseudo legal captures and promotions (en passant included) of the side to move, for staged move generation
+    def getCaptureMoves(self):
+        moves = []
+        color, enemyColor = ("w", "b") if self.whiteToMove else ("b", "w")
+        enemies = self.colorBitboards[enemyColor]
+        occupied = self.colorBitboards[color] | enemies
+        enPassantBit = 1 << squareOf(*self.enPassantPossible) if self.enPassantPossible else 0
+        promotionRow, step = (1, -8) if self.whiteToMove else (6, 8)
+        for sq in bitSquares(self.pieceBitboards[color + "p"]):
+            r, c = sq >> 3, sq & 7
+            attacks = pawnAttacks[color][sq]
+            self.addMoves(r, c, attacks & enemies, moves)
+            if attacks & enPassantBit:
+                moves.append(Move((r, c), self.enPassantPossible, self.board, isEnPassantMove=True))
+            if r == promotionRow and not occupied >> (sq + step) & 1:
+                moves.append(Move((r, c), ((sq + step) >> 3, c), self.board))
+        for pieceType in "NBRQK":
+            for sq in bitSquares(self.pieceBitboards[color + pieceType]):
+                self.addMoves(sq >> 3, sq & 7, self.pieceAttacks(pieceType, sq, occupied) & enemies, moves)
+        return moves
 
+    #pseudo legal moves that neither capture nor promote, castling included unless in check
+    def getQuietMoves(self, inCheck):
+        moves = []
+        color = "w" if self.whiteToMove else "b"
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        promotionRow, startRow, step = (1, 6, -8) if self.whiteToMove else (6, 1, 8)
+        for sq in bitSquares(self.pieceBitboards[color + "p"]):
+            r, c = sq >> 3, sq & 7
+            if r != promotionRow and not occupied >> (sq + step) & 1:
+                moves.append(Move((r, c), ((sq + step) >> 3, c), self.board))
+                if r == startRow and not occupied >> (sq + 2 * step) & 1:
+                    moves.append(Move((r, c), ((sq + 2 * step) >> 3, c), self.board))
+        for pieceType in "NBRQK":
+            for sq in bitSquares(self.pieceBitboards[color + pieceType]):
+                self.addMoves(sq >> 3, sq & 7, self.pieceAttacks(pieceType, sq, occupied) & ~occupied, moves)
+        if not inCheck:
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            self.getCastleMoves(kingRow, kingCol, moves)
+        return moves
 
+    #squares a knight, bishop, rook, queen or king on sq attacks
+    def pieceAttacks(self, pieceType, sq, occupied):
+        if pieceType == "N":
+            return knightAttacks[sq]
+        if pieceType == "B":
+            return bishopAttacks(sq, occupied)
+        if pieceType == "R":
+            return rookAttacks(sq, occupied)
+        if pieceType == "Q":
+            return queenAttacks(sq, occupied)
+        return kingAttacks[sq]
+
+    #the pseudo legal move with this move id, None if there isn't one (e.g. a hash move from a colliding position)
+    #only the moves of the piece on the start square are generated
+    def getMoveByID(self, moveID, inCheck):
+        r, c = moveID >> 9, (moveID >> 6) & 7
+        piece = self.board[r][c]
+        if piece == "--" or (piece[0] == "w") != self.whiteToMove:
+            return None
+        moves = []
+        self.moveFunctions[piece[1]](r, c, moves)
+        if piece[1] == "K" and not inCheck:
+            self.getCastleMoves(r, c, moves)
+        for move in moves:
+            if move.moveID == moveID:
+                return move
+        return None
 
-    def getPawnMoves(self, r, c, moves):
-        if self.whiteToMove:  # white pawn
-            if self.board[r-1][c]== "--": #one square forward move for the pawn
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r - 2][c] == "--" : # 2 square pawn advance
-                    moves.append(Move((r, c), (r - 2, c), self.board))
+    #add a move from (r,c) to every square in the targets bitboard
+    def addMoves(self, r, c, targets, moves):
+        while targets:
+            lowestBit = targets & -targets
+            endSq = lowestBit.bit_length() - 1
+            moves.append(Move((r, c), (endSq >> 3, endSq & 7), self.board))
+            targets ^= lowestBit
 
-            if c-1 >= 0: #captures to the left
-                if self.board[r-1][c-1][0] == "b":
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1,c-1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isEnPassantMove=True))
 
-            if c+1 < len(self.board[0]): #captures to the right
-                if self.board[r-1][c+1][0] == "b":
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r - 1, c + 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r - 1, c+1), self.board, isEnPassantMove=True))
 
 
+    def getPawnMoves(self, r, c, moves):
+        sq = r * 8 + c
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        enPassantBit = 1 << squareOf(*self.enPassantPossible) if self.enPassantPossible else 0
+        if self.whiteToMove:  # white pawn
+            if not occupied >> (sq - 8) & 1: #one square forward move for the pawn
+                moves.append(Move((r, c), (r-1, c), self.board))
+                if r == 6 and not occupied >> (sq - 16) & 1: # 2 square pawn advance
+                    moves.append(Move((r, c), (r - 2, c), self.board))
+            attacks = pawnAttacks["w"][sq]
+            self.addMoves(r, c, attacks & self.colorBitboards["b"], moves) #captures
+            if attacks & enPassantBit:
+                moves.append(Move((r, c), self.enPassantPossible, self.board, isEnPassantMove=True))
 
         else:  # black pawn
             if r+1<8:
-                if self.board[r+1][c]== "--": #one square forward move for the pawn
+                if not occupied >> (sq + 8) & 1: #one square forward move for the pawn
                     moves.append(Move((r, c), (r+1, c), self.board))
-                    if r == 1 and self.board[r +2][c] == "--" : # 2 square pawn advance
+                    if r == 1 and not occupied >> (sq + 16) & 1: # 2 square pawn advance
                         moves.append(Move((r, c), (r +2, c), self.board))
-
-                if c - 1 >= 0:  # captures to the left
-                    if self.board[r+1][c - 1][0] == "w":
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                    elif (r + 1, c - 1) == self.enPassantPossible:
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board, isEnPassantMove=True))
-
-                if c + 1 < len(self.board[0]): #captures to the right
-                    if self.board[r+1][c + 1][0] == "w":
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                    elif (r + 1, c + 1) == self.enPassantPossible:
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board, isEnPassantMove=True))
-
-
+                attacks = pawnAttacks["b"][sq]
+                self.addMoves(r, c, attacks & self.colorBitboards["w"], moves) #captures
+                if attacks & enPassantBit:
+                    moves.append(Move((r, c), self.enPassantPossible, self.board, isEnPassantMove=True))
 
 
     def getKnightMoves(self, r, c, moves):
-        possibleKnightMoves = [(1,2), (2,1), (-2,1), (-1,2), (2, -1), (1,-2), (-2,-1), (-1,-2)]
-
-        if self.whiteToMove: opp = "b"
-        else: opp = "w"
-
-        for d in possibleKnightMoves:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if (self.board[endRow][endCol]  == "--") or (self.board[endRow][endCol][0] == opp):
-                    moves.append(Move((r, c), (r+d[0], c+d[1]), self.board))
+        allyColor = "w" if self.whiteToMove else "b"
+        self.addMoves(r, c, knightAttacks[r * 8 + c] & ~self.colorBitboards[allyColor], moves)
 
     def getRookMoves(self, r, c, moves):
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # up, down, left, right
-        if self.whiteToMove:
-            enemy_color = 'b'
-        else:
-            enemy_color = 'w'
-
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":  # empty square
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemy_color:  # capture enemy piece
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break  # cannot jump over pieces
-                    else:
-                        break  # friendly piece blocks path
-                else:
-                    break  # off board
+        allyColor = "w" if self.whiteToMove else "b"
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        self.addMoves(r, c, rookAttacks(r * 8 + c, occupied) & ~self.colorBitboards[allyColor], moves)
 
     def getBishopMoves(self, r, c, moves):
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]  # four diagonals
-        enemy_color = 'b' if self.whiteToMove else 'w'
-
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":  # empty square
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemy_color:  # capture enemy piece
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break  # cannot jump over pieces
-                    else:
-                        break  # friendly piece blocks path
-                else:
-                    break  # off board
+        allyColor = "w" if self.whiteToMove else "b"
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        self.addMoves(r, c, bishopAttacks(r * 8 + c, occupied) & ~self.colorBitboards[allyColor], moves)
 
     def getQueenMoves(self, r, c, moves):
         # Queen moves are rook moves + bishop moves combined
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+        allyColor = "w" if self.whiteToMove else "b"
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        self.addMoves(r, c, queenAttacks(r * 8 + c, occupied) & ~self.colorBitboards[allyColor], moves)
 
     def getKingMoves(self, r, c, moves):
-        possibleKingMoves = [(1, 1), (-1, -1), (-1, 0), (-1, 1), (1, 0), (0, -1), (1, -1), (0, 1)]
         allyColor = "w" if self.whiteToMove else "b"
-        if not self.whiteToMove:
-            opp = "w"
-        else:
-            opp = "b"
-        for d in possibleKingMoves:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if(self.board[endRow][endCol] == "--") or (self.board[endRow][endCol][0] == opp):
-                    moves.append(Move((r, c), (r+d[0], c+d[1]), self.board))
-
-        #castling
+        self.addMoves(r, c, kingAttacks[r * 8 + c] & ~self.colorBitboards[allyColor], moves)
 
 
 
     #generating all valid castle moves for the king at (r,c) and add them to the list of moves
     def getCastleMoves(self, r, c, moves):
-        if self.squareUnderAttack(r,c):
+        if self.whiteToMove:
+            kingSide = self.castlingBits & WHITE_KINGSIDE and self.board[r][c+1] == "--" and self.board[r][c+2] == "--"
+            queenSide = self.castlingBits & WHITE_QUEENSIDE and self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--"
+        else:
+            kingSide = self.castlingBits & BLACK_KINGSIDE and self.board[r][c+1] == "--" and self.board[r][c+2] == "--"
+            queenSide = self.castlingBits & BLACK_QUEENSIDE and self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--"
+        if not kingSide and not queenSide:
+            return
+
+        #the king's square and every square it crosses are looked up together
+        squares = [(r, c)]
+        if kingSide:
+            squares += [(r, c+1), (r, c+2)]
+        if queenSide:
+            squares += [(r, c-1), (r, c-2)]
+        attacked = self.squaresUnderAttack(squares)
+        if (r, c) in attacked:
             return #can't castle if in check
-        if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks):
-            self.getKingSideCastleMoves(r, c,moves)
-
-        if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs):
-            self.getQueenSideCastleMoves(r, c, moves)
 
+        if kingSide:
+            self.getKingSideCastleMoves(r, c, moves, attacked)
+        if queenSide:
+            self.getQueenSideCastleMoves(r, c, moves, attacked)
 
 
+    def getKingSideCastleMoves(self, r, c, moves, attacked):
+        if (r, c+1) not in attacked and (r, c+2) not in attacked:
+            moves.append(Move((r, c), (r, c+2), self.board, isCastleMove = True))
 
-    def getKingSideCastleMoves(self, r, c, moves):
-        if self.board[r][c+1] == "--" and self.board[r][c+2] == "--":
-            if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove = True))
 
-
-
-    def getQueenSideCastleMoves(self, r, c, moves):
-        if self.board[r][c - 1] == "--" and self.board[r][c - 2] == "--" and self.board[r][c - 3] == "--":
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
-                moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
+    def getQueenSideCastleMoves(self, r, c, moves, attacked):
+        if (r, c-1) not in attacked and (r, c-2) not in attacked:
+            moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
 
 
 
@@ -400,6 +874,15 @@ class CastleRights:
         self.wqs = wqs
         self.bqs = bqs
 
+    #pack the rights into 4 bits: wks = 1, wqs = 2, bks = 4, bqs = 8
+    def toBits(self):
+        return self.wks | self.wqs << 1 | self.bks << 2 | self.bqs << 3
+
+    @classmethod
+    def fromBits(cls, bits):
+        return cls(bool(bits & WHITE_KINGSIDE), bool(bits & BLACK_KINGSIDE), bool(bits & WHITE_QUEENSIDE),
+                   bool(bits & BLACK_QUEENSIDE))
+
 
 
 
@@ -414,6 +897,10 @@ class Move: #stores all info about the current move, piece captured, en passant,
     filesToCols ={"a" : 0 , "b" : 1, "c" : 2, "d" : 3, "e" : 4, "f" : 5, "g" : 6, "h" : 7 }
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
+    #a fixed set of attributes instead of a per move __dict__, moves are created by the thousand in every search
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isEnPassantMove",
+                 "isCapture", "isCastleMove", "isPawnPromotion", "moveID")
+
 
     def __init__(self, startSq, endSq, board, isEnPassantMove = False, isCastleMove = False): #enpassant, castling possibility
 
@@ -437,12 +924,10 @@ class Move: #stores all info about the current move, piece captured, en passant,
 
 
         #pawn promotion
-        self.isPawnPromotion = False
-        if (self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7):
-            self.isPawnPromotion = True
+        self.isPawnPromotion = (self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7)
 
-        #id of each move ex: g1f3
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        #id of each move packed in 12 bits: start square (row * 8 + col) in the high 6 bits, end square in the low 6
+        self.moveID = (self.startRow << 9) | (self.startCol << 6) | (self.endRow << 3) | self.endCol
 
 
     #Overriding the equals method
@@ -451,6 +936,9 @@ class Move: #stores all info about the current move, piece captured, en passant,
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     def getChessNotation(self):
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
@@ -481,3 +969,7 @@ class Move: #stores all info about the current move, piece captured, en passant,
 
 
 
+
+
+#the move log entry of a null move (GameState.makeNullMove): nothing moved and nothing captured
+NULL_MOVE = Move((0, 0), (0, 0), [["--"]])
@@ -0,0 +1,60 @@
+"""
+Static evaluation tables, in integer centipawns.
+The GameState keeps the material and piece-square totals up to date as pieces move, so the AI reads them
+instead of rescanning the board. computeScores recomputes both totals from scratch to check the incremental ones.
+Totals are from white's point of view: white pieces count positive, black pieces negative.
+"""
+from Chess.ChessBitboards import bitSquares
+
+pieceValues = {"K": 0, "Q": 900, "R": 500, "B": 301, "N": 300, "p": 100}
+
+#piece-square tables from white's side of the board, black reads them mirrored (row 7 - r)
+pawnScores =[
+[0,  0,  0,  0,  0,  0,  0,  0],
+[50, 50, 50, 50, 50, 50, 50, 50],
+[10, 10, 20, 30, 30, 20, 10, 10],
+[ 5,  5, 10, 25, 25, 10,  5,  5],
+ [0,  0,  0, 20, 20,  0,  0,  0],
+ [5, -5,-10,  0,  0,-10, -5,  5],
+ [5, 10, 10,-20,-20, 10, 10,  5],
+ [0,  0,  0,  0,  0,  0,  0,  0]
+]
+
+kingScores=[
+[-30,-40,-40,-50,-50,-40,-40,-30],
+[-30,-40,-40,-50,-50,-40,-40,-30],
+[-30,-40,-40,-50,-50,-40,-40,-30],
+[-30,-40,-40,-50,-50,-40,-40,-30],
+[-20,-30,-30,-40,-40,-30,-30,-20],
+[-10,-20,-20,-20,-20,-20,-20,-10],
+[20, 20,  0,  0,  0,  0, 20, 20],
+[20, 40, 10,  0,  0, 10, 30, 20]
+]
+
+piecePositionScores = {
+    'p': pawnScores,
+    'K' : kingScores
+                        }
+
+#signed lookups per piece ("wp", "bK", ...) so an update is a single add
+materialScores = {}
+positionScores = {}
+for pieceType, value in pieceValues.items():
+    table = piecePositionScores.get(pieceType)
+    materialScores["w" + pieceType] = value
+    materialScores["b" + pieceType] = -value
+    positionScores["w" + pieceType] = [table[sq >> 3][sq & 7] if table else 0 for sq in range(64)]
+    positionScores["b" + pieceType] = [-table[7 - (sq >> 3)][sq & 7] if table else 0 for sq in range(64)]
+
+
+'''
+Compute the material and piece-square totals of a game state from scratch
+'''
+def computeScores(gs):
+    material = 0
+    position = 0
+    for piece, bb in gs.pieceBitboards.items():
+        for sq in bitSquares(bb):
+            material += materialScores[piece]
+            position += positionScores[piece][sq]
+    return material, position
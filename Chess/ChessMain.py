@@ -33,7 +33,7 @@ def main():
     screen.fill(p.Color("white"))
     gs= ChessEngine.GameState()
     moveLogFont = p.font.SysFont("Times New Roman", 14, False, False)
-    validMoves = gs.getValidMoves()
+    validMoves, status = gs.getValidMovesAndStatus()
     moveMade = False
     animate = False    #Flag variable to check if moveMade = True not because of undo
     gameOver = False
@@ -90,7 +90,8 @@ def main():
                     #resetting the board
                 if event.key == pygame.K_r: #reset the board when 'r' is pressed
                     gs = ChessEngine.GameState() #reinstate the game state completely
-                    validMoves = gs.getValidMoves()
+                    ChessAI.transpositionTable.clear()
+                    validMoves, status = gs.getValidMovesAndStatus()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
@@ -123,19 +124,19 @@ def main():
         if moveMade:
             if animate:
                 animateMove(gs.moveLog[-1], screen, gs.board, clock)
-            validMoves = gs.getValidMoves()
+            validMoves, status = gs.getValidMovesAndStatus()
             moveMade = False
 
 
         drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
 
-        if gs.checkMate:
+        if status == ChessEngine.STATUS_CHECKMATE:
             gameOver = True
             if gs.whiteToMove:
                 drawText(screen, "Black Wins!")
             else:
                 drawText(screen, "White Wins!")
-        elif gs.staleMate:
+        elif status == ChessEngine.STATUS_STALEMATE:
             gameOver = True
             drawText(screen, "Stale Mate!")
 
@@ -0,0 +1,226 @@
+"""
+Parallel search across CPU cores. CPython threads can't search in parallel, so every searcher is a process.
+Lazy SMP: all processes search the same root, sharing one transposition table in shared memory. Half of them start
+an iteration deeper than the main search, so they fill the table ahead of it. The deepest completed result wins.
+Root split: the root moves are handed out one at a time to whichever process is free, each with its own tables.
+The best score so far is shared so every move after the first is searched against it.
+Run the scaling benchmark from the project root with:
+python -m Chess.ChessParallel [--mode lazy|root] [--max-workers N] [--time S | --depth D]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from Chess.ChessAI import Searcher, TT_SIZE_MB, CHECKMATE, DEPTH, MAX_DEPTH
+from Chess.ChessBenchmark import benchmarkPositions
+from Chess.ChessEngine import GameState
+from Chess.ChessTranspositionTable import SharedTranspositionTable
+
+#per worker process: a searcher on the shared table, and the flag the main process raises to end a search
+workerSearcher = None
+workerStopEvent = None
+#per root split worker process: the best root score so far, shared by all of them, and the search that the
+#worker's move ordering state belongs to
+workerAlpha = None
+workerSearchID = None
+
+
+def initWorker(tableName, stopEvent):
+    global workerSearcher, workerStopEvent
+    workerStopEvent = stopEvent
+    workerSearcher = Searcher(SharedTranspositionTable(name=tableName), verbose=False)
+    workerSearcher.stopCheck = stopEvent.is_set
+
+
+'''
+One process's share of a lazy SMP search, returns (move notation, score, completed depth, nodes)
+'''
+def workerSearch(fen, timeLimit, nodeLimit, depth, startDepth):
+    gs = GameState.fromFEN(fen)
+    validMoves = gs.getValidMoves()
+    move = workerSearcher.findBestMove(gs, validMoves, timeLimit, nodeLimit, depth, startDepth)
+    return move.getChessNotation(), workerSearcher.bestScore, workerSearcher.completedDepth, workerSearcher.counter
+
+
+'''
+Drop-in for Searcher.findBestMove that searches with a pool of processes. The pool and the shared table live until
+close() is called, so they are set up once per game rather than once per move.
+nodeLimit applies to each process.
+'''
+class LazySMPSearcher:
+    def __init__(self, workers=None, ttSizeMB=TT_SIZE_MB):
+        self.workers = workers or os.cpu_count() or 1
+        self.transpositionTable = SharedTranspositionTable(ttSizeMB)
+        self.stopEvent = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(self.workers, initializer=initWorker,
+                                         initargs=(self.transpositionTable.name, self.stopEvent))
+        self.counter = 0 #nodes searched by all processes
+        self.bestScore = None
+        self.completedDepth = 0
+
+    def findBestMove(self, gs, validMoves, timeLimit=None, nodeLimit=None, depth=None):
+        fen = gs.toFEN()
+        self.transpositionTable.newSearch()
+        self.stopEvent.clear()
+        #process 0 is the main search, every odd numbered helper runs one iteration ahead of it
+        pending = [self.pool.apply_async(workerSearch, (fen, timeLimit, nodeLimit, depth, 1 + i % 2))
+                   for i in range(self.workers)]
+        results = [pending[0].get()]
+        self.stopEvent.set() #the helpers only matter while the main search runs
+        results += [result.get() for result in pending[1:]]
+
+        self.counter = sum(result[3] for result in results)
+        #deepest completed iteration, the main search wins a tie
+        notation, self.bestScore, self.completedDepth, _ = max(results, key=lambda result: result[2])
+        for move in validMoves:
+            if move.getChessNotation() == notation:
+                return move
+        return validMoves[0]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.transpositionTable.close()
+
+
+def initRootWorker(alpha, ttSizeMB):
+    global workerSearcher, workerAlpha
+    workerAlpha = alpha
+    workerSearcher = Searcher(ttSizeMB=ttSizeMB, verbose=False)
+
+
+'''
+Search one root move to depth against the shared alpha, task is (searchID, fen, move notation, depth, stopTime).
+Returns (move notation, score, exact, nodes, stopped). A score that doesn't beat the alpha it was searched
+against is only an upper bound.
+'''
+def rootMoveSearch(task):
+    global workerSearchID
+    searchID, fen, notation, depth, stopTime = task
+    if searchID != workerSearchID:
+        workerSearcher.newSearch() #killers and history carry over between the root moves of one search only
+        workerSearchID = searchID
+    gs = GameState.fromFEN(fen)
+    move = next(move for move in gs.getValidMoves() if move.getChessNotation() == notation)
+    workerSearcher.searchDepth = depth
+    workerSearcher.startDepth = 0 #the time budget applies from the first node
+    workerSearcher.stopTime = stopTime
+    workerSearcher.searchStopped = False
+    nodes = workerSearcher.counter
+    alpha = workerAlpha.value
+    gs.makeMove(move)
+    score = -workerSearcher.findNegaMaxAlphaBetaMove(gs, gs.getValidMoves(), depth - 1, -CHECKMATE, -alpha,
+                                                     1 if gs.whiteToMove else -1)
+    if workerSearcher.searchStopped:
+        return notation, 0, False, workerSearcher.counter - nodes, True
+    with workerAlpha.get_lock():
+        if score > workerAlpha.value:
+            workerAlpha.value = score
+    return notation, score, score > alpha, workerSearcher.counter - nodes, False
+
+
+'''
+Drop-in for Searcher.findBestMove that splits the root moves over a pool of processes, one ply deeper at a time.
+The first move of each iteration (the best of the previous one) is searched alone to set the bound. The rest go
+to the pool one move per task, so a process that finishes early takes the next move left.
+'''
+class RootSplitSearcher:
+    def __init__(self, workers=None, ttSizeMB=TT_SIZE_MB):
+        self.workers = workers or os.cpu_count() or 1
+        self.alpha = multiprocessing.Value("i", -CHECKMATE)
+        self.pool = multiprocessing.Pool(self.workers, initializer=initRootWorker, initargs=(self.alpha, ttSizeMB))
+        self.searchID = 0
+        self.counter = 0 #nodes searched by all processes
+        self.bestScore = None
+        self.completedDepth = 0
+
+    def findBestMove(self, gs, validMoves, timeLimit=None, nodeLimit=None, depth=None):
+        self.searchID += 1
+        self.counter = 0
+        self.bestScore = None
+        self.completedDepth = 0
+        fen = gs.toFEN()
+        if depth is None:
+            depth = DEPTH if timeLimit is None and nodeLimit is None else MAX_DEPTH
+        depth = min(depth, MAX_DEPTH)
+        startTime = time.time()
+        order = [move.getChessNotation() for move in validMoves]
+        for searchDepth in range(1, depth + 1):
+            #the first iteration always runs to the end so there is a move to play
+            stopTime = startTime + timeLimit if timeLimit is not None and searchDepth > 1 else None
+            tasks = [(self.searchID, fen, notation, searchDepth, stopTime) for notation in order]
+            self.alpha.value = -CHECKMATE
+            results = [self.pool.apply(rootMoveSearch, (tasks[0],))]
+            if not results[0][4]:
+                results += self.pool.imap_unordered(rootMoveSearch, tasks[1:])
+            self.counter += sum(result[3] for result in results)
+            if any(result[4] for result in results):
+                break #the unfinished iteration can't be trusted, keep the previous one
+            #best first for the next iteration, an exact score ahead of an upper bound equal to it
+            results.sort(key=lambda result: (-result[1], not result[2]))
+            order = [result[0] for result in results]
+            self.bestScore = results[0][1]
+            self.completedDepth = searchDepth
+            #an iteration takes longer than everything before it, so don't start one that can't finish
+            if timeLimit is not None and time.time() - startTime > timeLimit / 2:
+                break
+            if nodeLimit is not None and self.counter >= nodeLimit:
+                break
+        for move in validMoves:
+            if move.getChessNotation() == order[0]:
+                return move
+        return validMoves[0]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+'''
+Search every benchmark position with 1 to maxWorkers processes, at a fixed time per move or to a fixed depth.
+Prints the node rate, the total time and the average depth reached for each process count.
+mode is "lazy" for lazy SMP or "root" for the root split search.
+'''
+def scalingBenchmark(maxWorkers=None, timeLimit=2.0, ttSizeMB=TT_SIZE_MB, mode="lazy", depth=None):
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+    searcherClass = LazySMPSearcher if mode == "lazy" else RootSplitSearcher
+    if depth is not None:
+        timeLimit = None
+    print("workers  nodes/s     seconds  speedup  avg depth")
+    baseRate = baseSeconds = None
+    for workers in range(1, maxWorkers + 1):
+        searcher = searcherClass(workers, ttSizeMB)
+        nodes = 0
+        depths = 0
+        startTime = time.perf_counter()
+        try:
+            for fen in benchmarkPositions:
+                gs = GameState.fromFEN(fen)
+                searcher.findBestMove(gs, gs.getValidMoves(), timeLimit, depth=depth)
+                nodes += searcher.counter
+                depths += searcher.completedDepth
+        finally:
+            searcher.close()
+        seconds = time.perf_counter() - startTime
+        baseRate = baseRate or nodes / seconds
+        baseSeconds = baseSeconds or seconds
+        #at a fixed time the node rate shows the gain, to a fixed depth the time to get there does
+        speedup = nodes / seconds / baseRate if depth is None else baseSeconds / seconds
+        print("%7d  %10d  %7.2f  %7.2f  %9.2f" %
+              (workers, nodes / seconds, seconds, speedup, depths / len(benchmarkPositions)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel search scaling benchmark")
+    parser.add_argument("--mode", choices=("lazy", "root"), default="lazy", help="lazy SMP or root split search")
+    parser.add_argument("--max-workers", type=int, help="largest process count to try (default: one per core)")
+    parser.add_argument("--time", type=float, default=2.0, help="seconds per position")
+    parser.add_argument("--depth", type=int, help="search every position to this depth instead of for a fixed time")
+    parser.add_argument("--hash", type=int, default=TT_SIZE_MB, help="transposition table size in MB")
+    args = parser.parse_args()
+    scalingBenchmark(args.max_workers, args.time, args.hash, args.mode, args.depth)
+
+
+if __name__ == '__main__':
+    main()
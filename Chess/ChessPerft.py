@@ -0,0 +1,125 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+The counts prove move generation correct against known reference numbers, and the timing measures its speed.
+Run from the project root with: python -m Chess.ChessPerft [--depth N] [--position NAME] [--divide] [--json FILE]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from Chess.ChessEngine import GameState
+
+'''
+Standard perft reference positions (chessprogramming.org/Perft_Results) with their node counts per depth.
+The engine always promotes to a queen, so these counts only include queen promotions.
+They differ from the published numbers wherever under-promotions are possible.
+'''
+referencePositions = {
+    "startpos": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                 [20, 400, 8902, 197281, 4865609]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4074224]),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624]),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 228, 8087, 320802]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [41, 1373, 54007, 1806790]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594]),
+}
+
+#depth each position is checked to by default, keeps the whole suite to well under a minute
+defaultDepths = {"startpos": 4, "kiwipete": 3, "position3": 4, "position4": 3, "position5": 3, "position6": 3}
+
+
+def perft(gs, depth):
+    moves = gs.generateValidMoves()[0] #straight from the generator, the move cache would only hide its speed
+    if depth == 1:
+        return len(moves) #bulk counting, the leaves don't need to be played
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+'''
+Perft split by root move, the standard way to find which move a wrong count comes from
+'''
+def divide(gs, depth):
+    counts = {}
+    for move in gs.generateValidMoves()[0]:
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undoMove()
+    return counts
+
+
+'''
+Run perft on one position to each depth up to maxDepth, returns a result dict per depth
+'''
+def runPosition(name, fen, expectedCounts, maxDepth, showDivide=False):
+    results = []
+    for depth in range(1, maxDepth + 1):
+        gs = GameState.fromFEN(fen)
+        startTime = time.perf_counter()
+        if showDivide and depth == maxDepth:
+            counts = divide(gs, depth)
+            nodes = sum(counts.values())
+            for moveNotation in sorted(counts):
+                print("    %s: %d" % (moveNotation, counts[moveNotation]))
+        else:
+            nodes = perft(gs, depth)
+        seconds = time.perf_counter() - startTime
+        expected = expectedCounts[depth - 1] if depth <= len(expectedCounts) else None
+        results.append({"position": name, "depth": depth, "nodes": nodes, "expected": expected,
+                        "ok": expected is None or nodes == expected, "seconds": round(seconds, 4),
+                        "nps": int(nodes / seconds) if seconds > 0 else 0})
+        print("%-10s depth %d  nodes %10d  expected %10s  %8.2fs  %9d nps  %s" %
+              (name, depth, nodes, expected, seconds, results[-1]["nps"], "ok" if results[-1]["ok"] else "MISMATCH"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft correctness and speed suite for ChessEngine.GameState")
+    parser.add_argument("--depth", type=int, help="depth to check every position to (default: per position)")
+    parser.add_argument("--position", choices=sorted(referencePositions), action="append",
+                        help="only run this position, can be repeated")
+    parser.add_argument("--fen", help="run an arbitrary position instead of the reference ones (no expected counts)")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move at the last depth")
+    parser.add_argument("--json", help="append the results of this run as one JSON line to this file")
+    args = parser.parse_args()
+
+    if args.fen:
+        positions = {"fen": (args.fen, [])}
+    else:
+        positions = {name: referencePositions[name] for name in (args.position or referencePositions)}
+
+    results = []
+    for name, (fen, expectedCounts) in positions.items():
+        depth = args.depth or defaultDepths.get(name, 3)
+        results += runPosition(name, fen, expectedCounts, depth, args.divide)
+
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    print("total nodes %d in %.2fs, %d nps" % (totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds else 0))
+
+    if args.json:
+        with open(args.json, "a") as resultsFile:
+            resultsFile.write(json.dumps({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                          "python": platform.python_version(),
+                                          "totalNodes": totalNodes, "totalSeconds": round(totalSeconds, 4),
+                                          "results": results}) + "\n")
+
+    failed = [result for result in results if not result["ok"]]
+    if failed:
+        print("FAILED:", ", ".join("%s depth %d" % (result["position"], result["depth"]) for result in failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
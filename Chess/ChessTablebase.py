@@ -0,0 +1,403 @@
+"""
+Endgame tablebases for positions with few pieces (KQvK, KRvK, KPvK, ...), generated here by retrograde analysis.
+A table holds one byte per (piece squares, side to move): 0 for a draw (or an impossible position), 1-127 for a win
+with mate in that many plies, 128 + n for a loss with mate in n plies, both with best play from both sides.
+Tables are stored zlib compressed in Chess/tablebases and only the material signature's pieces are indexed,
+so a table of n pieces has 2 * 64^n entries. Tables with the colors reversed (KvKQ) are read by mirroring the board.
+Like the engine, pawns only promote to queens, and castling and en passant are left out.
+Run from the project root with:
+python -m Chess.ChessTablebase generate [KQvK KRvK KPvK ...]  /  python -m Chess.ChessTablebase probe FEN
+"""
+import argparse
+import array
+import os
+import time
+import zlib
+
+from Chess.ChessBitboards import bitSquares, knightAttacks, kingAttacks, pawnAttacks, rookAttacks, bishopAttacks, \
+    queenAttacks
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+DEFAULT_TABLES = ("KQvK", "KRvK", "KPvK")
+FILE_MAGIC = b"CTB1"
+FILE_EXTENSION = ".ctb"
+
+#order of the pieces after the king in a signature, and which side counts as the stronger one
+pieceOrder = "QRBNP"
+pieceStrength = {"Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+#signatures that can't be won by either side, they need no table
+drawnSignatures = {"KvK", "KBvK", "KNvK"}
+
+#decoded results
+WIN = 1
+DRAW = 0
+LOSS = -1
+LOSS_OFFSET = 128
+
+#tables loaded so far by signature, None when there's no file for it
+loadedTables = {}
+#largest number of pieces among the table files on disk, looked up on first use
+availablePieces = None
+
+
+'''
+The pieces of a signature as (color, type), kings first then the other white and black pieces in signature order
+'''
+def signaturePieces(signature):
+    white, black = signature.split("v")
+    return [("w", "K"), ("b", "K")] + [("w", pieceType) for pieceType in white[1:]] + \
+           [("b", pieceType) for pieceType in black[1:]]
+
+
+'''
+Signature of a list of (color, type, square) pieces, and whether the colors have to be swapped to find its table
+(the stronger side is always white in a table)
+'''
+def canonicalSignature(pieces):
+    white = sorted((pieceType for color, pieceType, _ in pieces if color == "w" and pieceType != "K"), key=pieceOrder.index)
+    black = sorted((pieceType for color, pieceType, _ in pieces if color == "b" and pieceType != "K"), key=pieceOrder.index)
+    whiteStrength = (sum(pieceStrength[pieceType] for pieceType in white), len(white))
+    blackStrength = (sum(pieceStrength[pieceType] for pieceType in black), len(black))
+    flip = blackStrength > whiteStrength
+    if flip:
+        white, black = black, white
+    return "K" + "".join(white) + "vK" + "".join(black), flip
+
+
+def pieceAttacks(color, pieceType, sq, occupied):
+    if pieceType == "K":
+        return kingAttacks[sq]
+    if pieceType == "N":
+        return knightAttacks[sq]
+    if pieceType == "B":
+        return bishopAttacks(sq, occupied)
+    if pieceType == "R":
+        return rookAttacks(sq, occupied)
+    if pieceType == "Q":
+        return queenAttacks(sq, occupied)
+    return pawnAttacks[color][sq]
+
+
+#is sq attacked by any of the pieces of color, with the given squares (None for a captured piece)
+def isAttacked(sq, color, pieces, squares, occupied):
+    bit = 1 << sq
+    for (pieceColor, pieceType), pieceSq in zip(pieces, squares):
+        if pieceColor == color and pieceSq is not None and pieceAttacks(pieceColor, pieceType, pieceSq, occupied) & bit:
+            return True
+    return False
+
+
+def squaresIndex(squares):
+    index = 0
+    for i, sq in enumerate(squares):
+        index |= sq << (6 * i)
+    return index
+
+
+'''
+Raw table byte for a list of (color, type, square) pieces with side (0 white, 1 black) to move.
+getTable(signature) returns the table bytes, or None when there isn't one.
+Returns None when the table is missing.
+'''
+def lookupPieces(pieces, side, getTable):
+    signature, flip = canonicalSignature(pieces)
+    if signature in drawnSignatures:
+        return 0
+    table = getTable(signature)
+    if table is None:
+        return None
+    if flip:
+        pieces = [("b" if color == "w" else "w", pieceType, sq ^ 56) for color, pieceType, sq in pieces]
+        side ^= 1
+    remaining = list(pieces)
+    squares = []
+    for color, pieceType in signaturePieces(signature):
+        for i, piece in enumerate(remaining):
+            if piece[0] == color and piece[1] == pieceType:
+                squares.append(piece[2])
+                del remaining[i]
+                break
+    return table[squaresIndex(squares) * 2 + side]
+
+
+def decodeValue(value):
+    if value == 0:
+        return DRAW, 0
+    if value < LOSS_OFFSET:
+        return WIN, value
+    return LOSS, value - LOSS_OFFSET
+
+
+'''
+Build the table of a signature by retrograde analysis. Every position's legal moves are counted first, and the
+moves that leave the table (captures, promotions) are scored from the smaller tables through getTable.
+Then, from the mates outwards one ply at a time, each decided position decides its predecessors: a loss makes every
+predecessor a win, a win takes one move off each predecessor's count, and a predecessor whose every move wins for
+the opponent is lost. Whatever is left undecided is a draw.
+'''
+def generateTable(signature, getTable, log=None):
+    pieces = signaturePieces(signature)
+    numPieces = len(pieces)
+    size = 2 * 64 ** numPieces
+    values = bytearray(size)
+    resolved = bytearray(size)
+    valid = bytearray(size)
+    counters = array.array("h", bytes(2 * size)) #legal moves not yet known to win for the opponent
+    lossDepth = bytearray(size) #longest win for the opponent among those moves, plus one
+    hasDraw = bytearray(size) #a move out of the table draws, so the position can't be lost
+    buckets = {} #plies -> [(index, WIN or LOSS)] of positions decided at that distance from mate
+    kings = (0, 1)
+    pawnRows = {"w": (6, 0), "b": (1, 7)} #start row and promotion row
+    startTime = time.time()
+
+    def addToBucket(plies, index, result):
+        if plies not in buckets:
+            buckets[plies] = []
+        buckets[plies].append((index, result))
+
+    for squareSet in range(64 ** numPieces):
+        squares = [(squareSet >> (6 * i)) & 63 for i in range(numPieces)]
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        if bin(occupied).count("1") != numPieces:
+            continue
+        if any(pieceType == "P" and sq >> 3 in (0, 7) for (color, pieceType), sq in zip(pieces, squares)):
+            continue
+        for side in (0, 1):
+            mover, opponent = ("w", "b") if side == 0 else ("b", "w")
+            if isAttacked(squares[kings[side ^ 1]], mover, pieces, squares, occupied):
+                continue #the side that just moved left its king in check
+            index = squareSet * 2 + side
+            valid[index] = 1
+            ownOccupied = 0
+            for (color, _), sq in zip(pieces, squares):
+                if color == mover:
+                    ownOccupied |= 1 << sq
+            legalMoves = 0
+            for i, (color, pieceType) in enumerate(pieces):
+                if color != mover:
+                    continue
+                sq = squares[i]
+                if pieceType == "P":
+                    step = -8 if mover == "w" else 8
+                    targets = pawnAttacks[mover][sq] & occupied & ~ownOccupied
+                    if not occupied & (1 << (sq + step)):
+                        targets |= 1 << (sq + step)
+                        if sq >> 3 == pawnRows[mover][0] and not occupied & (1 << (sq + 2 * step)):
+                            targets |= 1 << (sq + 2 * step)
+                else:
+                    targets = pieceAttacks(mover, pieceType, sq, occupied) & ~ownOccupied
+                for target in bitSquares(targets):
+                    newSquares = list(squares)
+                    newSquares[i] = target
+                    captured = None
+                    for j in range(numPieces):
+                        if j != i and squares[j] == target:
+                            captured = j
+                            newSquares[j] = None
+                    newOccupied = (occupied ^ (1 << sq)) | (1 << target)
+                    if isAttacked(newSquares[kings[side]], opponent, pieces, newSquares, newOccupied):
+                        continue
+                    legalMoves += 1
+                    promotion = pieceType == "P" and target >> 3 == pawnRows[mover][1]
+                    if captured is None and not promotion:
+                        continue #stays in this table, decided by the retrograde pass
+                    childPieces = [(color2, "Q" if j == i and promotion else pieceType2, newSquares[j])
+                                   for j, (color2, pieceType2) in enumerate(pieces) if newSquares[j] is not None]
+                    childValue = lookupPieces(childPieces, side ^ 1, getTable)
+                    if childValue is None:
+                        raise ValueError("%s needs the %s table" % (signature, canonicalSignature(childPieces)[0]))
+                    result, plies = decodeValue(childValue)
+                    if result == LOSS:
+                        addToBucket(plies + 1, index, WIN)
+                    elif result == WIN:
+                        counters[index] -= 1 #counted below with the in-table moves
+                        lossDepth[index] = max(lossDepth[index], plies + 1)
+                    else:
+                        counters[index] -= 1
+                        hasDraw[index] = 1
+            counters[index] += legalMoves
+            if legalMoves == 0:
+                if isAttacked(squares[kings[side]], opponent, pieces, squares, occupied):
+                    addToBucket(0, index, LOSS) #checkmate
+                else:
+                    resolved[index] = 1 #stalemate
+            elif counters[index] == 0 and not hasDraw[index]:
+                addToBucket(lossDepth[index], index, LOSS)
+    if log:
+        log("%s: counted moves in %.1fs" % (signature, time.time() - startTime))
+
+    while buckets:
+        plies = min(buckets)
+        for index, result in buckets.pop(plies):
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            values[index] = plies if result == WIN else LOSS_OFFSET + plies
+            for predecessor in predecessors(index, pieces, pawnRows):
+                if resolved[predecessor] or not valid[predecessor]:
+                    continue
+                if result == LOSS:
+                    addToBucket(plies + 1, predecessor, WIN)
+                else:
+                    counters[predecessor] -= 1
+                    lossDepth[predecessor] = max(lossDepth[predecessor], plies + 1)
+                    if counters[predecessor] == 0 and not hasDraw[predecessor]:
+                        addToBucket(lossDepth[predecessor], predecessor, LOSS)
+    if log:
+        log("%s: generated in %.1fs" % (signature, time.time() - startTime))
+    return bytes(values)
+
+
+'''
+Indices of the positions one non-capturing, non-promoting move before the position at index
+'''
+def predecessors(index, pieces, pawnRows):
+    numPieces = len(pieces)
+    side = index & 1
+    squareSet = index >> 1
+    squares = [(squareSet >> (6 * i)) & 63 for i in range(numPieces)]
+    previousMover = "b" if side == 0 else "w"
+    occupied = 0
+    for sq in squares:
+        occupied |= 1 << sq
+    found = []
+    for i, (color, pieceType) in enumerate(pieces):
+        if color != previousMover:
+            continue
+        sq = squares[i]
+        if pieceType == "P":
+            step = 8 if color == "w" else -8 #backwards
+            origins = 0
+            fromSq = sq + step
+            if 0 <= fromSq < 64 and fromSq >> 3 not in (0, 7) and not occupied & (1 << fromSq):
+                origins |= 1 << fromSq
+                if fromSq >> 3 != pawnRows[color][0] and (fromSq + step) >> 3 == pawnRows[color][0] and \
+                        not occupied & (1 << (fromSq + step)):
+                    origins |= 1 << (fromSq + step)
+        else:
+            origins = pieceAttacks(color, pieceType, sq, occupied) & ~occupied
+        for origin in bitSquares(origins):
+            found.append(((squareSet & ~(63 << (6 * i))) | origin << (6 * i)) * 2 + (side ^ 1))
+    return found
+
+
+def tablePath(signature, directory=TABLEBASE_DIR):
+    return os.path.join(directory, signature + FILE_EXTENSION)
+
+
+def saveTable(signature, table, directory=TABLEBASE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    with open(tablePath(signature, directory), "wb") as tableFile:
+        tableFile.write(FILE_MAGIC + bytes([len(signature)]) + signature.encode() + zlib.compress(table, 9))
+
+
+def loadTable(signature):
+    if signature not in loadedTables:
+        path = tablePath(signature)
+        table = None
+        if os.path.exists(path):
+            with open(path, "rb") as tableFile:
+                data = tableFile.read()
+            headerSize = len(FILE_MAGIC) + 1 + data[len(FILE_MAGIC)]
+            if data[:len(FILE_MAGIC)] != FILE_MAGIC or data[len(FILE_MAGIC) + 1:headerSize].decode() != signature:
+                raise ValueError("Not a tablebase file for %s: %s" % (signature, path))
+            table = zlib.decompress(data[headerSize:])
+        loadedTables[signature] = table
+    return loadedTables[signature]
+
+
+#largest piece count the tables on disk cover, 0 when there are none
+def maxPieces():
+    global availablePieces
+    if availablePieces is None:
+        availablePieces = 0
+        if os.path.isdir(TABLEBASE_DIR):
+            for name in os.listdir(TABLEBASE_DIR):
+                if name.endswith(FILE_EXTENSION):
+                    availablePieces = max(availablePieces, len(name) - len(FILE_EXTENSION) - 1)
+    return availablePieces
+
+
+'''
+Tablebase result of a game state as (WIN, DRAW or LOSS for the side to move, plies to mate),
+None when there's no table for its material or it still has castling rights
+'''
+def probe(gs):
+    if gs.castlingBits:
+        return None
+    if gs.pieceCount() > max(maxPieces(), 2):
+        return None
+    pieces = []
+    for piece, bb in gs.pieceBitboards.items():
+        for sq in bitSquares(bb):
+            pieces.append((piece[0], piece[1].upper(), sq))
+    value = lookupPieces(pieces, 0 if gs.whiteToMove else 1, loadTable)
+    return decodeValue(value) if value is not None else None
+
+
+'''
+The best move of a position in the tablebases: the fastest win, else a draw, else the longest loss.
+Returns (move, (result, plies)) with the result for the side to move, or None when a move leads out of the tables.
+'''
+def bestMove(gs, validMoves):
+    best = None
+    bestKey = None
+    for move in validMoves:
+        gs.makeMove(move)
+        child = probe(gs)
+        gs.undoMove()
+        if child is None:
+            return None
+        result, plies = child #for the opponent
+        key = (-result, -plies if result == LOSS else plies)
+        if bestKey is None or key > bestKey:
+            best, bestKey = (move, (-result, plies + 1 if result != DRAW else 0)), key
+    return best
+
+
+def generate(signatures, directory=TABLEBASE_DIR):
+    def getTable(signature):
+        table = loadTable(signature)
+        if table is None:
+            #generate the smaller tables a capture or promotion leads to first
+            table = generateTable(signature, getTable, print)
+            saveTable(signature, table, directory)
+            loadedTables[signature] = table
+        return table
+    global availablePieces
+    for signature in signatures:
+        if not os.path.exists(tablePath(signature, directory)):
+            getTable(signature)
+    availablePieces = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebase generator and prober")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generateParser = subparsers.add_parser("generate", help="generate tables (and the smaller ones they need)")
+    generateParser.add_argument("signatures", nargs="*", default=list(DEFAULT_TABLES), help="e.g. KQvK KRvK KPvK")
+    probeParser = subparsers.add_parser("probe", help="look a position up")
+    probeParser.add_argument("fen")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate(args.signatures)
+    else:
+        from Chess.ChessEngine import GameState
+        gs = GameState.fromFEN(args.fen)
+        result = probe(gs)
+        if result is None:
+            print("not in the tablebases")
+        else:
+            names = {WIN: "win", DRAW: "draw", LOSS: "loss"}
+            print("%s for the side to move, mate in %d plies" % (names[result[0]], result[1]) if result[0] != DRAW
+                  else "draw")
+            best = bestMove(gs, gs.getValidMoves())
+            if best is not None:
+                print("best move", best[0].getChessNotation())
+
+
+if __name__ == '__main__':
+    main()
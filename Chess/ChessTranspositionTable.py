@@ -0,0 +1,149 @@
+"""
+Fixed size transposition table for the AI search.
+Positions are found by their zobrist key. Each bucket holds two entries: a depth-preferred slot that keeps the
+deepest result (unless it's left over from an earlier search) and an always-replace slot that takes everything else.
+"""
+import sys
+
+#bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1 #the search failed high, the real score is at least this
+UPPER_BOUND = 2 #the search failed low, the real score is at most this
+
+#rough cost of one entry: a list slot, a 6-tuple and the ints inside it
+ENTRY_BYTES = 8 + sys.getsizeof((0,) * 6) + 5 * 32
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=16):
+        self.sizeMB = sizeMB
+        self.numBuckets = max(1, sizeMB * 1024 * 1024 // (2 * ENTRY_BYTES))
+        #entry at 2 * bucket is the depth-preferred slot, 2 * bucket + 1 the always-replace slot
+        #each entry is a tuple (key, depth, score, flag, bestMoveID, generation)
+        self.entries = [None] * (2 * self.numBuckets)
+        self.generation = 0
+
+    def clear(self):
+        self.entries = [None] * (2 * self.numBuckets)
+        self.generation = 0
+
+    #called at the start of every search so entries from earlier searches can be told apart and replaced
+    def newSearch(self):
+        self.generation += 1
+
+    #returns the entry stored for the key, or None
+    def probe(self, key):
+        index = (key % self.numBuckets) * 2
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.entries[index + 1]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, bestMoveID):
+        index = (key % self.numBuckets) * 2
+        entry = (key, depth, score, flag, bestMoveID, self.generation)
+        deepest = self.entries[index]
+        if deepest is None or deepest[0] == key or depth >= deepest[1] or deepest[5] != self.generation:
+            if deepest is not None and deepest[0] != key:
+                self.entries[index + 1] = deepest #the replaced entry still gets a chance in the other slot
+            self.entries[index] = entry
+        else:
+            self.entries[index + 1] = entry
+
+
+'''
+The same table in a multiprocessing.shared_memory block, so several search processes can share one (lazy SMP).
+Each entry is two 64-bit words: the key xor the packed data, then the packed data. Processes write without locks;
+an entry torn by two writes at once no longer xors back to its key and is just a miss.
+Packed data: depth 8 bits | score + 32768 16 bits | flag 2 bits | move id + 1 13 bits | generation 8 bits | in use 1 bit
+'''
+SHARED_ENTRY_BYTES = 16
+SHARED_HEADER_WORDS = 2 #word 0 holds the generation, word 1 the bucket count
+SCORE_OFFSET = 1 << 15
+IN_USE_BIT = 1 << 47
+
+
+class SharedTranspositionTable:
+    #create a new table, or attach to the one another process created when name is given
+    def __init__(self, sizeMB=16, name=None):
+        from multiprocessing import shared_memory
+        self.owner = name is None
+        if self.owner:
+            self.numBuckets = max(1, sizeMB * 1024 * 1024 // (2 * SHARED_ENTRY_BYTES))
+            size = (SHARED_HEADER_WORDS + 4 * self.numBuckets) * 8
+            self.sharedMemory = shared_memory.SharedMemory(create=True, size=size)
+            self.words = self.sharedMemory.buf.cast("Q")
+            self.words[1] = self.numBuckets
+        else:
+            #attaching from a multiprocessing child registers the block with the parent's resource tracker again,
+            #which is harmless: it is only freed when the creating process calls close()
+            self.sharedMemory = shared_memory.SharedMemory(name=name)
+            self.words = self.sharedMemory.buf.cast("Q")
+            #the block can be bigger than asked for (macOS rounds it up to whole pages), so the bucket count
+            #is read from the header rather than worked out from its size
+            self.numBuckets = self.words[1]
+        self.name = self.sharedMemory.name
+        self.sizeMB = self.numBuckets * 2 * SHARED_ENTRY_BYTES // (1024 * 1024)
+
+    @property
+    def generation(self):
+        return self.words[0]
+
+    #empty every entry and restart the generation count, the bucket count stays
+    def clear(self):
+        start = SHARED_HEADER_WORDS * 8
+        self.sharedMemory.buf[start:] = bytes(self.sharedMemory.size - start)
+        self.words[0] = 0
+
+    #only the creating process moves the generation on, the others are helpers searching the same position
+    def newSearch(self):
+        if self.owner:
+            self.words[0] += 1
+
+    def probe(self, key):
+        index = SHARED_HEADER_WORDS + (key % self.numBuckets) * 4
+        words = self.words
+        data = words[index + 1]
+        if data and words[index] ^ data == key:
+            return unpackEntry(key, data)
+        data = words[index + 3]
+        if data and words[index + 2] ^ data == key:
+            return unpackEntry(key, data)
+        return None
+
+    def store(self, key, depth, score, flag, bestMoveID):
+        index = SHARED_HEADER_WORDS + (key % self.numBuckets) * 4
+        words = self.words
+        generation = words[0] & 0xFF
+        data = (min(depth, 0xFF) | (score + SCORE_OFFSET) << 8 | flag << 24 |
+                (bestMoveID + 1 if bestMoveID is not None else 0) << 26 | generation << 39 | IN_USE_BIT)
+        deepestData = words[index + 1]
+        deepestKey = words[index] ^ deepestData
+        if (not deepestData or deepestKey == key or depth >= deepestData & 0xFF or
+                (deepestData >> 39) & 0xFF != generation):
+            if deepestData and deepestKey != key:
+                #the replaced entry still gets a chance in the other slot
+                words[index + 2] = words[index]
+                words[index + 3] = deepestData
+            words[index] = key ^ data
+            words[index + 1] = data
+        else:
+            words[index + 2] = key ^ data
+            words[index + 3] = data
+
+    #detach from the shared block, the creating process also frees it
+    def close(self):
+        self.words.release()
+        self.sharedMemory.close()
+        if self.owner:
+            self.sharedMemory.unlink()
+
+
+def unpackEntry(key, data):
+    moveID = (data >> 26) & 0x1FFF
+    return (key, data & 0xFF, ((data >> 8) & 0xFFFF) - SCORE_OFFSET, (data >> 24) & 3,
+            moveID - 1 if moveID else None, (data >> 39) & 0xFF)
+
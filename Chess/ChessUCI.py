@@ -0,0 +1,242 @@
+"""
+Headless UCI (Universal Chess Interface) front end, for tournament managers and servers without a display.
+Reads commands from stdin and answers on stdout. The search runs in a background thread so stop and isready
+are answered while it thinks.
+Run from the project root with: python -m Chess.ChessUCI
+"""
+import sys
+import threading
+
+ENGINE_NAME = "Chess Engine in Python"
+ENGINE_AUTHOR = "Chess Engine in Python authors"
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining clock time is shared over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 #seconds kept back per move for the GUI and the process to pass the move on
+
+
+'''
+Seconds to spend on a move given the clock, the increment and the moves left to the next time control (all in ms)
+'''
+def allocateTime(timeLeft, increment=0, movesToGo=None):
+    seconds = (timeLeft / (movesToGo or DEFAULT_MOVES_TO_GO) + increment * 0.75) / 1000
+    return max(0.01, min(seconds, timeLeft / 2000) - MOVE_OVERHEAD)
+
+
+class UCIEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()
+        #the engine and the AI are imported on first use, so answering "uci" doesn't wait for the move tables
+        self.ChessEngine = None
+        self.ChessAI = None
+        self.hashSizeMB = None
+        self.profile = False #time the parts of the search and send the stats as an info string after each search
+        self.ownBook = True #answer from the opening book while the position is in it
+        self.book = None
+        self.bookPath = None
+        self.searcher = None
+        self.gs = None
+        self.searchThread = None
+        self.stopEvent = threading.Event()
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def loadEngine(self):
+        if self.ChessAI is None:
+            from Chess import ChessEngine, ChessAI
+            self.ChessEngine = ChessEngine
+            self.ChessAI = ChessAI
+            self.hashSizeMB = self.hashSizeMB or ChessAI.TT_SIZE_MB
+            self.searcher = self.newSearcher()
+            self.gs = ChessEngine.GameState()
+
+    def newSearcher(self):
+        searcher = self.ChessAI.Searcher(ttSizeMB=self.hashSizeMB, verbose=False, profile=self.profile)
+        searcher.onIteration = lambda stats: self.send(stats.uciInfo())
+        return searcher
+
+    #run commands until quit or the end of input
+    def run(self, commands=sys.stdin):
+        for line in commands:
+            if not self.handleCommand(line):
+                break
+        self.stopSearch()
+
+    #returns False when the engine should exit
+    def handleCommand(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default 16 min 1 max 1024")
+            self.send("option name Profile type check default false")
+            self.send("option name OwnBook type check default true")
+            self.send("option name BookFile type string default <default>")
+            self.send("uciok")
+        elif command == "isready":
+            self.loadEngine()
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(tokens[1:])
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.loadEngine()
+            self.searcher.transpositionTable.clear()
+            self.gs = self.ChessEngine.GameState()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.startSearch(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            return False
+        return True
+
+    def setOption(self, tokens):
+        #setoption name <name> value <value>
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if name.lower() == "hash" and value.isdigit():
+            self.stopSearch()
+            self.hashSizeMB = max(1, int(value))
+            if self.searcher is not None:
+                self.searcher = self.newSearcher()
+        elif name.lower() == "ownbook":
+            self.ownBook = value.lower() == "true"
+        elif name.lower() == "bookfile":
+            self.stopSearch()
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            self.bookPath = None if value in ("", "<default>") else value
+        elif name.lower() == "profile":
+            self.stopSearch()
+            self.profile = value.lower() == "true"
+            if self.searcher is not None:
+                self.searcher.profile = self.profile
+        else:
+            self.send("info string unknown option " + name)
+
+    def setPosition(self, tokens):
+        #position startpos [moves ...] or position fen <fen> [moves ...]
+        self.loadEngine()
+        moves = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if tokens and tokens[0] == "fen":
+            try:
+                self.gs = self.ChessEngine.GameState.fromFEN(" ".join(tokens[1:moves]))
+            except ValueError as e:
+                self.send("info string " + str(e))
+                return
+        else:
+            self.gs = self.ChessEngine.GameState()
+        for moveText in tokens[moves + 1:]:
+            #the engine always promotes to a queen, so a promotion piece letter is ignored
+            move = next((move for move in self.gs.getValidMoves() if move.getChessNotation() == moveText[:4]), None)
+            if move is None:
+                self.send("info string illegal move " + moveText)
+                return
+            self.gs.makeMove(move)
+
+    def startSearch(self, tokens):
+        self.loadEngine()
+        options = {}
+        infinite = False
+        i = 0
+        while i < len(tokens):
+            if tokens[i] == "infinite":
+                infinite = True
+            elif tokens[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                #a value that is missing or not a number is skipped, the search goes ahead without it
+                try:
+                    options[tokens[i]] = int(tokens[i + 1])
+                    i += 1
+                except (IndexError, ValueError):
+                    self.send("info string ignoring go " + tokens[i] + " without a number")
+            i += 1
+
+        timeLimit = None
+        nodeLimit = options.get("nodes")
+        depth = options.get("depth")
+        if depth is not None:
+            depth = max(1, min(depth, self.ChessAI.MAX_DEPTH))
+        if "movetime" in options:
+            timeLimit = max(0.01, options["movetime"] / 1000 - MOVE_OVERHEAD)
+        else:
+            timeLeft = options.get("wtime" if self.gs.whiteToMove else "btime")
+            if timeLeft is not None:
+                timeLimit = allocateTime(timeLeft, options.get("winc" if self.gs.whiteToMove else "binc", 0),
+                                         options.get("movestogo"))
+        if infinite:
+            timeLimit, nodeLimit, depth = None, None, self.ChessAI.MAX_DEPTH
+
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(timeLimit, nodeLimit, depth, infinite),
+                                             daemon=True)
+        self.searchThread.start()
+
+    #runs in the search thread, a bestmove line is sent whatever happens so the GUI is never left waiting
+    def search(self, timeLimit, nodeLimit, depth, infinite):
+        bestMove = None
+        searching = False
+        try:
+            validMoves = self.gs.getValidMoves()
+            if validMoves and self.ownBook:
+                bestMove = self.findBookMove(validMoves)
+            if validMoves and bestMove is None:
+                searching = True
+                bestMove = self.searcher.findBestMove(self.gs, validMoves, timeLimit, nodeLimit, depth)
+                if self.profile:
+                    self.send("info string " + str(self.searcher.stats))
+        except Exception as e:
+            self.send("info string search failed: " + repr(e))
+            if searching:
+                bestMove = self.searcher.stats.bestMove #the move of the deepest iteration that finished, if any
+        finally:
+            if infinite:
+                self.stopEvent.wait() #in infinite mode the move is only sent once the GUI asks for it
+            if bestMove is None:
+                self.send("bestmove 0000")
+            else:
+                self.send("bestmove " + bestMove.getChessNotation() + ("q" if bestMove.isPawnPromotion else ""))
+
+    def findBookMove(self, validMoves):
+        from Chess import ChessBook
+        if self.bookPath is None:
+            return ChessBook.findBookMove(self.gs, validMoves)
+        if self.book is None:
+            try:
+                self.book = ChessBook.OpeningBook(self.bookPath)
+            except OSError as e:
+                self.send("info string can't open book: " + str(e))
+                self.ownBook = False
+                return None
+        return self.book.chooseMove(self.gs, validMoves)
+
+    #stop a running search and wait for it to send its move
+    def stopSearch(self):
+        if self.searchThread is None:
+            return
+        self.stopEvent.set()
+        #keep asking until the thread is gone, a stop sent before the search got going would otherwise be lost
+        while self.searchThread.is_alive():
+            self.searcher.stop()
+            self.searchThread.join(0.01)
+        self.searchThread = None
+
+
+def main():
+    UCIEngine().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Zobrist keys for identifying positions.
+Every (piece, square), the side to move, each castling rights combination and each en passant file
+gets a fixed random 64-bit number, the key of a position is the xor of the numbers that apply to it.
+A second key built from the pawns alone is kept alongside it for pawn structure caches.
+"""
+import random
+
+from Chess.ChessBitboards import bitSquares
+
+#fixed seed so keys are the same on every run and in every process
+keyGenerator = random.Random(0x5EED)
+
+pieceKeys = {color + pieceType: [keyGenerator.getrandbits(64) for _ in range(64)]
+             for color in "wb" for pieceType in "pNBRQK"}
+blackToMoveKey = keyGenerator.getrandbits(64)
+#indexed by the 4-bit castling rights: wks = 1, wqs = 2, bks = 4, bqs = 8
+castlingKeys = [keyGenerator.getrandbits(64) for _ in range(16)]
+enPassantKeys = [keyGenerator.getrandbits(64) for _ in range(8)]
+
+
+'''
+Compute the position key and the pawn key of a game state from scratch
+'''
+def computeKeys(gs):
+    key = 0
+    pawnKey = 0
+    for piece, bb in gs.pieceBitboards.items():
+        for sq in bitSquares(bb):
+            key ^= pieceKeys[piece][sq]
+            if piece[1] == 'p':
+                pawnKey ^= pieceKeys[piece][sq]
+    if not gs.whiteToMove:
+        key ^= blackToMoveKey
+    key ^= castlingKeys[gs.castlingBits]
+    if gs.enPassantPossible:
+        key ^= enPassantKeys[gs.enPassantPossible[1]]
+    return key, pawnKey